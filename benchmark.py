@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from utils import imageConverter
+from utils import ui
+from utils import consoleWriter
+from utils.displayCompositor import DisplayCompositor
+from utils.syntheticFrames import createSyntheticFrame
+from utils.frameSource import ImageDirectorySource
+from models.dataclasses import LegoColor
+from models.detector import Detector
+from models.templateClassifier import TemplateClassifier
+import models.algorithms as alg
+import models.colorLookup as colorLookup
+
+@contextmanager
+def suppressOutput():
+    '''Silences stdout / stderr on file descriptor level (print and spawned shells).'''
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        os.dup2(devnull.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+def prepareInputs(frame, detector):
+    '''Runs the Detection Chain once to get the Inputs of every single Stage.'''
+    result = detector.detect(frame)
+    shapes = result.coloredShapes
+
+    # Mask of the biggest Shape for getMinBBox
+    roi_mask = None
+    if len(shapes) > 0:
+        shape = max(shapes, key=lambda shape: shape.roi[2] * shape.roi[3])
+        roi_mask = imageConverter.tryCutRoiWithOffset(shape.roi, alg.ROI_OFFSET, result.color_masks[shape.color])
+
+    return {
+        'frame': frame,
+        'canvas': frame.copy(),
+        'console_image': np.zeros((400, 900, 3), dtype=np.uint8),
+        'mask': result.color_masks[LegoColor.BLUE],
+        'label_map': result.label_map,
+        'color_masks': result.color_masks,
+        'cleaned_masks': result.cleaned_masks,
+        'seperated': [result.getSeperatedImage(color) for color in LegoColor],
+        'shapes': shapes,
+        'roi_mask': roi_mask
+    }
+
+# (Name, depends on the Brick Count, Function)
+BENCHMARKS = [
+    ('colorSegmentation', False,
+     lambda d, ctx: alg.colorSegmentation(d['frame'], 3, np.array([100, 100, 0]), np.array([170, 255, 255]))),
+    ('segmentColors', False,
+     lambda d, ctx: alg.segmentColors(d['frame'], alg.BACKGROUND_RANGE, alg.COLOR_RANGES)),
+    ('segmentColorsWithLUT', False,
+     lambda d, ctx: alg.segmentColorsWithLUT(d['frame'], ctx['color_lut'], alg.BACKGROUND_RANGE.kernalSize)),
+    ('morphology_open_and_close', False,
+     lambda d, ctx: alg.morphology_open_and_close(d['frame'], d['mask'], 3)),
+    ('cleanColorMasks', False,
+     lambda d, ctx: alg.cleanColorMasks(d['label_map'], alg.COLOR_RANGES)),
+    ('get_color_rois', True,
+     lambda d, ctx: alg.get_color_rois(*d['seperated'])),
+    ('get_color_component_table', True,
+     lambda d, ctx: alg.get_color_component_table(d['cleaned_masks'], 1000)),
+    ('determineShapeTypes', True,
+     lambda d, ctx: alg.determineShapeTypes(d['shapes'], d['color_masks'])),
+    ('determineShapeTypesFromComponents', True,
+     lambda d, ctx: alg.determineShapeTypesFromComponents(d['shapes'], 1000)),
+    # no Budget, the Time of matching every Shape
+    ('TemplateClassifier', True,
+     lambda d, ctx: ctx['template_classifier'].classify(d['shapes'], d['frame'], d['color_masks'])),
+    ('getMinBBox', False,
+     lambda d, ctx: alg.getMinBBox(d['roi_mask']) if d['roi_mask'] is not None else None),
+    ('ui.combineImages', False,
+     lambda d, ctx: ui.combineImages(np.array(d['seperated'][:2]), np.array(d['seperated'][2:]), 3)),
+    # preallocated Canvas, the Replacement of ui.combineImages in the Program
+    ('DisplayCompositor.mosaic', False,
+     lambda d, ctx: ctx['compositor'].mosaic(d['frame'], [d['cleaned_masks'][color] for color in LegoColor], 'mosaic')),
+    ('ui.drawBBoxes', True,
+     lambda d, ctx: ui.drawBBoxes(d['canvas'], d['shapes'], [0, 255, 0], 2)),
+    ('ui.drawInfo', True,
+     lambda d, ctx: ui.drawInfo(d['canvas'], d['shapes'], [0, 255, 0], 2)),
+    ('consoleWriter.writeShapeListToConsole', True,
+     lambda d, ctx: consoleWriter.writeShapeListToConsole(d['shapes'], True, d['console_image'])),
+    # unchanged Shapes and no Rate Limit, the steady State of the incremental Console
+    ('consoleWriter.ConsoleRenderer', True,
+     lambda d, ctx: ctx['console_renderer'].render(d['shapes'], (400, 900)))
+]
+
+def measure(function, min_time, min_runs):
+    '''Returns the Run Times in seconds after two warm-up runs.'''
+    function()
+    function()
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - start < min_time:
+        t_start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t_start)
+    return np.array(times)
+
+def loadDiskFrames(path, resolution):
+    source = ImageDirectorySource(path)
+    frames = []
+    while True:
+        frameAvailable, frame = source.read()
+        if not frameAvailable:
+            break
+        frame = imageConverter.getImageCenterSquare(frame)
+        frames.append(cv2.resize(frame, (resolution, resolution), interpolation=cv2.INTER_AREA))
+    return frames
+
+def runBenchmarks(resolutions, brick_counts, frames_dir, selected, min_time, min_runs, lut_bits):
+    detector = Detector()
+    ctx = {'color_lut': colorLookup.loadColorLUT('cache', alg.BACKGROUND_RANGE, alg.COLOR_RANGES, lut_bits),
+           'console_renderer': consoleWriter.ConsoleRenderer(max_rate=0),
+           'compositor': DisplayCompositor(),
+           'template_classifier': TemplateClassifier(budget=0)}
+    results = []
+
+    for resolution in resolutions:
+        if frames_dir is not None:
+            # on-disk Frames, the Brick Count is unknown
+            cases = [('disk', frame) for frame in loadDiskFrames(frames_dir, resolution)[:1]]
+        else:
+            cases = [(count, createSyntheticFrame(resolution, count, seed=count)[0]) for count in brick_counts]
+
+        for case_index, (brick_count, frame) in enumerate(cases):
+            inputs = prepareInputs(frame, detector)
+
+            for name, depends_on_bricks, function in BENCHMARKS:
+                if selected and name not in selected:
+                    continue
+                # Stages independent of the Brick Count only run on the first case
+                if not depends_on_bricks and case_index > 0:
+                    continue
+
+                with suppressOutput():
+                    times = measure(lambda: function(inputs, ctx), min_time, min_runs) * 1000
+
+                results.append({
+                    'benchmark': name,
+                    'resolution': resolution,
+                    'bricks': brick_count if depends_on_bricks else None,
+                    'shapes': len(inputs['shapes']),
+                    'runs': len(times),
+                    'median_ms': float(np.median(times)),
+                    'p95_ms': float(np.percentile(times, 95)),
+                    'min_ms': float(times.min())
+                })
+                row = results[-1]
+                bricks = '-' if row['bricks'] is None else row['bricks']
+                print(f'{name:<40} {resolution:>5} px {bricks:>5}   median {row["median_ms"]:8.3f} ms   '
+                      f'p95 {row["p95_ms"]:8.3f} ms   min {row["min_ms"]:8.3f} ms')
+
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the single detection stages.')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[480, 720, 1080])
+    parser.add_argument('--bricks', type=int, nargs='+', default=[1, 10, 40])
+    parser.add_argument('--frames-dir', default=None, help='use the first image of a directory instead of synthetic frames')
+    parser.add_argument('--only', nargs='+', default=None, help='names of the benchmarks to run')
+    parser.add_argument('--threads', type=int, default=None, help='OpenCV threads, e.g. 1 for comparable numbers')
+    parser.add_argument('--min-time', type=float, default=0.5, help='minimum seconds per benchmark')
+    parser.add_argument('--min-runs', type=int, default=10)
+    parser.add_argument('--lut-bits', type=int, default=7)
+    parser.add_argument('--output', default=None, help='JSON result file (default: benchmark_<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    # consoleWriter only prints while no loop is active
+    consoleWriter.loop_active = True
+
+    results = runBenchmarks(args.resolutions, args.bricks, args.frames_dir, args.only,
+                            args.min_time, args.min_runs, args.lut_bits)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'opencv_threads': cv2.getNumThreads()
+        },
+        'results': results
+    }
+
+    output = args.output or f'benchmark_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4)
+    print(f'Results written to {output}.')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils import imageConverter
+from models.dataclasses import LegoColor, ShapeType
+from models.detector import Detector
+from models.templateBank import TemplateBank
+from models.templateClassifier import TemplateClassifier
+import models.algorithms as alg
+import models.colorLookup as colorLookup
+
+STAGES = ['segmentation', 'separation', 'extraction', 'classification', 'total']
+
+# Detector of the Worker Process
+detector = None
+
+def initWorker(segmentation_mode, lut_cache_dir, lut_bits, classifier='ratio', template_dir=None, budget=0.0,
+               scale=1.0, refine=False):
+    global detector
+    color_lut = None
+    if segmentation_mode == 'lut':
+        color_lut = colorLookup.loadColorLUT(lut_cache_dir, alg.BACKGROUND_RANGE, alg.COLOR_RANGES, lut_bits)
+    template_classifier = None
+    if classifier == 'template':
+        template_classifier = TemplateClassifier(TemplateBank(template_dir, scale=scale), budget, scale=scale)
+    detector = Detector(color_lut, classifier=template_classifier, scale=scale, refine=refine)
+
+def evaluateImage(path):
+    '''Runs the Detection Chain stage by stage on one Image.\n
+       Returns the detected (color, type) Pairs and the Stage Latencies in seconds.'''
+    frame = cv2.imread(path)
+    if frame is None:
+        raise FileNotFoundError(f'Image {path} could not be read.')
+    frame_cropped = imageConverter.getImageCenterSquare(frame)
+
+    timings = {}
+    start = time.perf_counter()
+
+    frame_processed = detector.scaleFrame(frame_cropped)
+    foreground_mask, label_map = detector.segment(frame_processed)
+    t_segmented = time.perf_counter()
+
+    color_masks, cleaned_masks = detector.separate(label_map)
+    t_separated = time.perf_counter()
+
+    coloredShapes = detector.extractShapes(frame_processed, cleaned_masks, frame_cropped)
+    t_extracted = time.perf_counter()
+
+    coloredShapes = detector.classify(coloredShapes, frame_processed, color_masks)
+    t_classified = time.perf_counter()
+
+    timings['segmentation'] = t_segmented - start
+    timings['separation'] = t_separated - t_segmented
+    timings['extraction'] = t_extracted - t_separated
+    timings['classification'] = t_classified - t_extracted
+    timings['total'] = t_classified - start
+
+    detections = [(str(shape.color), str(shape.shapeType)) for shape in coloredShapes]
+    return detections, timings
+
+def loadLabels(labels_path):
+    '''Returns a List of (image path, [(color, type), ...]) from the Labels File.\n
+       Image paths are relative to the Labels File.'''
+    with open(labels_path) as file:
+        manifest = json.load(file)
+
+    base_dir = os.path.dirname(labels_path)
+    labels = []
+    for image in manifest['images']:
+        objects = [(obj['color'], obj['type']) for obj in image['objects']]
+        labels.append((os.path.join(base_dir, image['path']), objects))
+    return labels
+
+def countMatches(counts, expected, detected):
+    '''Counts TP / FP / FN per Class of one Image by matching the Class Counts.'''
+    expected_counter = Counter(expected)
+    detected_counter = Counter(detected)
+    for name in set(expected_counter) | set(detected_counter):
+        true_positives = min(expected_counter[name], detected_counter[name])
+        counts.setdefault(name, Counter())
+        counts[name]['tp'] += true_positives
+        counts[name]['fp'] += detected_counter[name] - true_positives
+        counts[name]['fn'] += expected_counter[name] - true_positives
+
+def summarizeCounts(counts):
+    summary = {}
+    for name, count in sorted(counts.items()):
+        tp, fp, fn = count['tp'], count['fp'], count['fn']
+        summary[name] = {
+            'tp': tp, 'fp': fp, 'fn': fn,
+            'precision': tp / (tp + fp) if tp + fp > 0 else None,
+            'recall': tp / (tp + fn) if tp + fn > 0 else None
+        }
+    return summary
+
+def summarizeLatencies(stage_timings):
+    summary = {}
+    for stage in STAGES:
+        values = np.array(stage_timings[stage]) * 1000
+        summary[stage] = {
+            'mean_ms': float(values.mean()),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'max_ms': float(values.max())
+        }
+    return summary
+
+def evaluate(labels_path, workers, repeat, segmentation_mode, lut_cache_dir, lut_bits,
+             classifier='ratio', template_dir=None, budget=0.0, scale=1.0, refine=False):
+    labels = loadLabels(labels_path)
+    paths = [path for path, _ in labels] * repeat
+
+    # Building the LUT once before the Workers memory-map it
+    initWorker(segmentation_mode, lut_cache_dir, lut_bits)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                             initargs=(segmentation_mode, lut_cache_dir, lut_bits,
+                                       classifier, template_dir, budget, scale, refine)) as executor:
+        results = list(executor.map(evaluateImage, paths))
+    wall_time = time.perf_counter() - start
+
+    color_counts = {str(color): Counter() for color in LegoColor}
+    type_counts = {str(shapeType): Counter() for shapeType in ShapeType}
+    stage_timings = {stage: [] for stage in STAGES}
+    per_image = []
+
+    # the Labels repeat in the same order as the Paths
+    for (path, expected), (detected, timings) in zip(labels * repeat, results):
+        countMatches(color_counts, [color for color, _ in expected], [color for color, _ in detected])
+        countMatches(type_counts, [shapeType for _, shapeType in expected], [shapeType for _, shapeType in detected])
+        for stage in STAGES:
+            stage_timings[stage].append(timings[stage])
+        if len(per_image) < len(labels):
+            per_image.append({'path': os.path.relpath(path), 'expected': expected, 'detected': detected})
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'labels': labels_path, 'workers': workers, 'repeat': repeat,
+            'segmentation_mode': segmentation_mode, 'lut_bits': lut_bits,
+            'classifier': classifier, 'classification_budget': budget,
+            'processing_scale': scale, 'refine': refine
+        },
+        'frames': len(paths),
+        'wall_time_s': wall_time,
+        'fps': len(paths) / wall_time,
+        'latency': summarizeLatencies(stage_timings),
+        'colors': summarizeCounts(color_counts),
+        'shape_types': summarizeCounts(type_counts),
+        'images': per_image
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Evaluates accuracy and throughput of the detection on labeled images.')
+    parser.add_argument('--labels', default=os.path.join('assets', 'labels.json'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=1, help='runs over the image set, for stable throughput numbers')
+    parser.add_argument('--segmentation', choices=['hsv', 'lut'], default='hsv')
+    parser.add_argument('--lut-cache-dir', default='cache')
+    parser.add_argument('--lut-bits', type=int, default=7)
+    parser.add_argument('--classifier', choices=['ratio', 'template'], default='ratio')
+    parser.add_argument('--template-dir', default=os.path.join('assets', 'd02_templates_s'))
+    parser.add_argument('--classification-budget', type=float, default=0,
+                        help='milliseconds of template matching per frame, 0 = no limit')
+    parser.add_argument('--scale', type=float, default=1.0, help='processing scale of the frames')
+    parser.add_argument('--refine', action='store_true', help='refine the shapes at full resolution (coarse-to-fine)')
+    parser.add_argument('--output', default=None, help='JSON result file (default: evaluation_<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    report = evaluate(args.labels, args.workers, args.repeat, args.segmentation, args.lut_cache_dir, args.lut_bits,
+                      args.classifier, args.template_dir, args.classification_budget / 1000, args.scale, args.refine)
+
+    output = args.output or f'evaluation_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print(f'{report["frames"]} frames in {report["wall_time_s"]:.2f} s ({report["fps"]:.1f} FPS)')
+    for stage, latency in report['latency'].items():
+        print(f'  {stage:<15} p50 {latency["p50_ms"]:7.2f} ms   p95 {latency["p95_ms"]:7.2f} ms')
+    for group in ['colors', 'shape_types']:
+        for name, summary in report[group].items():
+            if summary['tp'] + summary['fp'] + summary['fn'] == 0:
+                continue
+            precision = '-' if summary['precision'] is None else f'{summary["precision"]:.2f}'
+            recall = '-' if summary['recall'] is None else f'{summary["recall"]:.2f}'
+            print(f'  {name:<10} precision {precision:>5}   recall {recall:>5}')
+    print(f'Results written to {output}.')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
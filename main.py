@@ -7,6 +7,10 @@ from utils import consoleWriter
 
 config = dotenv_values(".env")
 
+# Running without any Windows, e.g. on machines without a display
+if '--headless' in sys.argv:
+    config['HEADLESS'] = '1'
+
 project_dir = config['PROJECT_DIR']
 
 if os.getcwd() != project_dir:
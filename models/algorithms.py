@@ -1,16 +1,76 @@
 import os
 import cv2
 import numpy as np
+from functools import lru_cache
 from utils import imageConverter as ic
 from models.dataclasses import LegoColor
 from models.dataclasses import ShapeType
+from models.dataclasses import ColorRange
+from models.shapeTable import ShapeTable
 
-def morphology_open_and_close(img, mask, kernalSize):
+# Separating the colored Pixels from the Background
+BACKGROUND_RANGE = ColorRange(None, [0, 75, 0], [255, 255, 255], 5)
+
+# Color specific Ranges. The Label Map holds one Color per Pixel, so the first matching Range wins on overlaps:
+# Hues 140-170 with a Saturation of at least 100 lie in BLUE and RED and are labeled BLUE only
+# (the former Masks per Range held them in both). No Pixel of the Images in assets/ lies in this overlap.
+COLOR_RANGES = [
+    ColorRange(LegoColor.BLUE, [100, 100, 0], [170, 255, 255], 3),
+    ColorRange(LegoColor.GREEN, [50, 27, 0], [100, 255, 131], 3),
+    ColorRange(LegoColor.RED, [140, 0, 0], [10, 255, 255], 1),
+    ColorRange(LegoColor.YELLOW, [11, 50, 0], [30, 255, 255], 3)
+]
+
+# Bit marking a Pixel as Foreground inside a Segmentation Code
+FOREGROUND_BIT = 0x80
+
+# Pixel Thresholds at full Resolution, the Detector scales them with its Processing Scale
+MIN_PIXEL_COUNT = 750  # BBox Pixels of a Shape
+MIN_AREA = 1000        # Component / Contour Area with a reliable Orientation
+ROI_OFFSET = 25        # Margin around a ROI cut out for the minimal BBox and Template Matching
+
+# Aspect Ratio Thresholds of the minimal BBox per Color, checked from the greatest Type
+THIN_RATIO_THRESHOLDS = [(3.19, ShapeType.ONE_X_FOUR), (2.4, ShapeType.ONE_X_THREE)]
+WIDE_RATIO_THRESHOLDS = [(1.8, ShapeType.TWO_X_FOUR), (0.9, ShapeType.TWO_X_TWO)]
+THIN_COLORS = [LegoColor.BLUE, LegoColor.YELLOW]
+# Aspect Ratio of the Studs per Type, the Confidence of a Ratio is highest there
+NOMINAL_RATIOS = {ShapeType.ONE_X_FOUR: 4.0, ShapeType.ONE_X_THREE: 3.0, ShapeType.TWO_X_FOUR: 2.0, ShapeType.TWO_X_TWO: 1.0}
 
-    morphKernal = cv2.getStructuringElement(cv2.MORPH_RECT, (kernalSize, kernalSize))
+@lru_cache(maxsize=None)
+def getMorphKernal(kernalSize):
+    return cv2.getStructuringElement(cv2.MORPH_RECT, (kernalSize, kernalSize))
+
+def scaleKernalSize(kernalSize, scale):
+    '''Odd Kernel Size (at least 1) with the Radius scaled, half Radii are rounded down,
+       so the Cleaning never grows relative to the Bricks.'''
+    radius = (kernalSize - 1) / 2 * scale
+    return 2 * max(0, int(np.ceil(radius - 0.5))) + 1
+
+def scaleColorRange(color_range, scale):
+    '''The Range itself at scale 1, otherwise a Copy with the scaled Kernel Size.'''
+    if scale == 1:
+        return color_range
+    return ColorRange(color_range.color, color_range.lower, color_range.higher,
+                      scaleKernalSize(color_range.kernalSize, scale))
+
+def cleanMask(mask, kernalSize):
+
+    morphKernal = getMorphKernal(kernalSize)
     mask_opening = cv2.morphologyEx(mask, cv2.MORPH_OPEN, morphKernal)
     mask_closing = cv2.morphologyEx(mask_opening, cv2.MORPH_CLOSE, morphKernal)
     
+    return mask_closing
+
+def cleanColorMasks(label_map, color_ranges):
+    '''Opening and Closing of every color Mask of the Label Map with the cached Kernels.\n
+       Returns {LegoColor: cleaned Mask}.'''
+    return {color_range.color: cleanMask(getColorMask(label_map, color_range.color), color_range.kernalSize)
+            for color_range in color_ranges}
+
+def morphology_open_and_close(img, mask, kernalSize):
+
+    mask_closing = cleanMask(mask, kernalSize)
+    
     result = cv2.bitwise_and(img, img, mask=mask_closing)
     return result
 
@@ -22,6 +82,100 @@ def colorSegmentation(img, kernalSize, lower, higher):
 
     return mask, result
 
+def buildSegmentationLUTs(background_range, color_ranges):
+    '''Compiles the Ranges into a per-channel LUT, which maps every HSV-Value
+       to a Bitmask of the Ranges containing it, and a LUT, which maps that
+       Bitmask to the Segmentation Code (LegoColor value | FOREGROUND_BIT).'''
+    if len(color_ranges) > 7:
+        raise ValueError('At most 7 ColorRanges can be segmented in a single pass.')
+
+    values = np.arange(256)
+    channel_lut = np.zeros((1, 256, 3), dtype=np.uint8)
+    
+    ranges = [(FOREGROUND_BIT, background_range)]
+    ranges += [(1 << i, color_range) for i, color_range in enumerate(color_ranges)]
+    
+    for bit, color_range in ranges:
+        for channel in range(3):
+            lower = color_range.lower[channel]
+            higher = color_range.higher[channel]
+            if lower <= higher:
+                inside = (values >= lower) & (values <= higher)
+            else:
+                # wrapping around, e.g. the Hue of red
+                inside = (values >= lower) | (values <= higher)
+            channel_lut[0, inside, channel] |= bit
+    
+    # the lowest set Bit decides the Color
+    code_lut = np.zeros(256, dtype=np.uint8)
+    for bits in range(1, 256):
+        color_bits = bits & ~FOREGROUND_BIT
+        code = bits & FOREGROUND_BIT
+        lowest = (color_bits & -color_bits).bit_length() - 1
+        if 0 <= lowest < len(color_ranges):
+            code |= color_ranges[lowest].color.value
+        code_lut[bits] = code
+
+    return channel_lut, code_lut
+
+@lru_cache(maxsize=8)
+def _getSegmentationLUTs(range_keys):
+    background_range, *color_ranges = [ColorRange(LegoColor(key[0]) if key[0] else None, *key[1:]) 
+                                       for key in range_keys]
+    return buildSegmentationLUTs(background_range, color_ranges)
+
+def getSegmentationCodes(img, background_range, color_ranges):
+    '''Converts the Image into HSV once and returns the per-Pixel Segmentation Codes.'''
+    range_keys = tuple(color_range.key() for color_range in [background_range] + color_ranges)
+    channel_lut, code_lut = _getSegmentationLUTs(range_keys)
+    
+    hsv = ic.convertToHSV(img)
+    hue_bits, sat_bits, val_bits = cv2.split(cv2.LUT(hsv, channel_lut))
+    bits = cv2.bitwise_and(hue_bits, sat_bits)
+    bits = cv2.bitwise_and(bits, val_bits, dst=bits)
+    
+    return cv2.LUT(bits, code_lut)
+
+def labelSegmentationCodes(codes, kernalSize):
+    '''Splits the Segmentation Codes into the cleaned Foreground Mask and the Label Map.'''
+    foreground_mask = cv2.compare(codes, FOREGROUND_BIT, cv2.CMP_GE)
+    foreground_mask = cleanMask(foreground_mask, kernalSize)
+    
+    # removing the Foreground Bit and every Label outside of the cleaned Foreground
+    label_map = cv2.bitwise_and(codes, 0x7F)
+    label_map = cv2.bitwise_and(label_map, foreground_mask, dst=label_map)
+    
+    return foreground_mask, label_map
+
+def segmentColors(img, background_range, color_ranges):
+    '''Single-pass Segmentation of all Colors.\n
+       Returns the Foreground Mask and a Label Map holding the LegoColor value
+       of every Pixel (0 for Background or unknown Colors).'''
+    codes = getSegmentationCodes(img, background_range, color_ranges)
+    return labelSegmentationCodes(codes, background_range.kernalSize)
+
+def getSegmentationCodesFromLUT(img, color_lut):
+    '''Looks up the Segmentation Codes of a BGR Image in a LUT from colorLookup.buildColorLUT.'''
+    bits = (len(color_lut).bit_length() - 1) // 3
+    shift = 8 - bits
+    
+    b, g, r = cv2.split(img)
+    index = (b >> shift).astype(np.int32)
+    index <<= bits
+    index |= g >> shift
+    index <<= bits
+    index |= r >> shift
+    
+    return color_lut[index]
+
+def segmentColorsWithLUT(img, color_lut, kernalSize):
+    '''Same as segmentColors, but without any HSV Conversion per Frame.'''
+    codes = getSegmentationCodesFromLUT(img, color_lut)
+    return labelSegmentationCodes(codes, kernalSize)
+
+def getColorMask(label_map, color):
+    return cv2.compare(label_map, color.value, cv2.CMP_EQ)
+
 def get_color_rois(masked_blue, masked_green, masked_red, masked_yellow):
     images_gray = np.array([ic.convertToGray(masked_blue.copy()),
                             ic.convertToGray(masked_green.copy()),
@@ -49,10 +203,90 @@ def get_color_rois(masked_blue, masked_green, masked_red, masked_yellow):
 
     return roi_dict
 
+def labelColorMask(mask, min_area=0):
+    '''Labels one color Mask.\n
+       Returns the Stats (x, y, w, h, area) and Centroids per Component and for Components
+       of at least min_area pixels the sides (short, long) and angle as in getMinBBox (NaN otherwise).'''
+    # nothing to label for Colors missing in the Frame
+    if cv2.countNonZero(mask) == 0:
+        return np.zeros((0, 5), np.int32), np.zeros((0, 2)), np.zeros((0, 2)), np.zeros(0)
+    
+    # block-based Labeling (Grana), clearly faster than the default on large Masks
+    count, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+        mask, 8, cv2.CV_32S, cv2.CCL_GRANA
+    )
+    stats, centroids = stats[1:], centroids[1:]
+    
+    sizes = np.full((count - 1, 2), np.nan)
+    angles = np.full(count - 1, np.nan)
+    for i in np.flatnonzero(stats[:, cv2.CC_STAT_AREA] >= min_area):
+        x, y, w, h = stats[i, :4]
+        component_mask = (labels[y:y+h, x:x+w] == i + 1).view(np.uint8)
+        size, angle = getComponentOrientation(component_mask)
+        if size is not None:
+            sizes[i] = size
+            angles[i] = angle
+    
+    return stats, centroids, sizes, angles
+
+def get_color_component_table(color_masks, min_area=0):
+    '''Labels every color Mask in a single pass.\n
+       Returns the Components of all Colors as one ShapeTable with the pixel area,
+       size as (short side, long side) and angle as in getMinBBox. Components smaller
+       than min_area get no size and angle. The Centroids are not kept, the Positions
+       are the BBox Centers (see determineShapePositions).'''
+    tables = []
+    
+    for color, mask in color_masks.items():
+        stats, _, sizes, angles = labelColorMask(mask, min_area)
+        
+        table = ShapeTable.empty(len(stats))
+        table.rows['roi'] = stats[:, :4]
+        table.rows['area'] = stats[:, cv2.CC_STAT_AREA]
+        table.rows['color'] = color.value
+        table.rows['size'] = sizes
+        table.rows['angle'] = angles
+        tables.append(table)
+
+    return ShapeTable.concatenate(tables)
+
+def getComponentOrientation(component_mask):
+    '''Estimates the sides of a rectangular Component from its Moments and its angle as in getMinBBox.\n
+       The Moments give no Axis for Squares (both Variances are equal), so the angle is always
+       taken from the minimal BBox of the Component.'''
+    moments = cv2.moments(component_mask, binaryImage=True)
+    area = moments['m00']
+    if area == 0:
+        return None, None
+    
+    # Covariance of the Pixel Coordinates
+    mu20 = moments['mu20'] / area
+    mu02 = moments['mu02'] / area
+    mu11 = moments['mu11'] / area
+    
+    # Eigenvalues, a filled w x h rectangle has the variances w^2/12 and h^2/12
+    mean = (mu20 + mu02) / 2
+    deviation = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+    long_side = np.sqrt(12 * (mean + deviation))
+    short_side = np.sqrt(12 * max(mean - deviation, 0))
+    
+    # one external Contour per Component
+    contours, _ = cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    _, size, angle = cv2.minAreaRect(max(contours, key=len))
+    correctedAngle = correctMinAreaRectAngle(size, angle)
+    
+    return (float(short_side), float(long_side)), float(correctedAngle)
+
 def determineShapePositions(shapes, image):
     h, w = image.shape[:2]
     length = min(h, w)
 
+    if isinstance(shapes, ShapeTable):
+        roi = shapes.rows['roi']
+        shapes.rows['pos'][:, 0] = (roi[:, 0] + roi[:, 2] // 2) / length
+        shapes.rows['pos'][:, 1] = (roi[:, 1] + roi[:, 3] // 2) / length
+        return shapes
+
     for shape in shapes:
         x, y, w, h = shape.roi
         center_x = x + w // 2
@@ -64,6 +298,10 @@ def determineShapePositions(shapes, image):
     return shapes
 
 def filterShapesByPixelCount(shapes, pixelCount):
+    if isinstance(shapes, ShapeTable):
+        roi = shapes.rows['roi']
+        return shapes[roi[:, 2].astype(np.int64) * roi[:, 3] > pixelCount]
+
     filtered = []
     for shape in shapes:
         x,y,w,h = shape.roi
@@ -73,34 +311,99 @@ def filterShapesByPixelCount(shapes, pixelCount):
 
     return filtered
 
-def determineShapeTypes(coloredShapes, color_masks):  
+def classifyByRatio(color, mbb_w, mbb_h):
+    '''Returns the most likely Type for the sides of the minimal BBox or None.'''
+    if min(mbb_w, mbb_h) == 0:
+        return None
+    
+    ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
+    thresholds = THIN_RATIO_THRESHOLDS if color in THIN_COLORS else WIDE_RATIO_THRESHOLDS
+    for threshold, shapeType in thresholds:
+        if ratio > threshold:
+            return shapeType
+    
+    return None
+
+def classifyByRatios(colors, sizes):
+    '''Vectorized classifyByRatio.\n
+       colors: LegoColor values, sizes: (short side, long side) per Shape.
+       Returns the ShapeType values, 0 where no Type matches.'''
+    short_sides = np.minimum(sizes[:, 0], sizes[:, 1])
+    long_sides = np.maximum(sizes[:, 0], sizes[:, 1])
+    valid = short_sides > 0
+    ratios = np.divide(long_sides, short_sides, out=np.zeros(len(sizes)), where=valid)
+    thin = np.isin(colors, [color.value for color in THIN_COLORS])
+    
+    conditions, choices = [], []
+    for is_thin, thresholds in [(thin, THIN_RATIO_THRESHOLDS), (~thin, WIDE_RATIO_THRESHOLDS)]:
+        for threshold, shapeType in thresholds:
+            conditions.append(valid & is_thin & (ratios > threshold))
+            choices.append(shapeType.value)
+    
+    return np.select(conditions, choices, 0).astype(np.uint8)
+
+def getRatioConfidence(color, shapeType, mbb_w, mbb_h):
+    '''Confidence (0..1) of a Type found by classifyByRatio: 1 at the nominal Ratio of the Type,
+       falling to 0 at the Ratio Thresholds to the neighbouring Types.'''
+    if shapeType not in NOMINAL_RATIOS or min(mbb_w, mbb_h) == 0:
+        return None
+    return float(getRatioConfidences(np.array([color.value]), np.array([[mbb_w, mbb_h]]),
+                                     np.array([shapeType.value]))[0])
+
+def getRatioConfidences(colors, sizes, types):
+    '''Vectorized getRatioConfidence, NaN where the Type has no nominal Ratio.'''
+    short_sides = np.minimum(sizes[:, 0], sizes[:, 1])
+    long_sides = np.maximum(sizes[:, 0], sizes[:, 1])
+    ratios = np.divide(long_sides, short_sides, out=np.zeros(len(sizes)), where=short_sides > 0)
+    thin = np.isin(colors, [color.value for color in THIN_COLORS])
+    confidences = np.full(len(sizes), np.nan)
+
+    for is_thin, thresholds in [(thin, THIN_RATIO_THRESHOLDS), (~thin, WIDE_RATIO_THRESHOLDS)]:
+        for i, (lower, shapeType) in enumerate(thresholds):
+            selected = is_thin & (types == shapeType.value)
+            nominal = NOMINAL_RATIOS[shapeType]
+            # Margin to every Threshold bounding the Type, relative to the Margin of the nominal Ratio
+            margins = [np.abs(ratios[selected] - lower) / abs(nominal - lower)]
+            if i > 0:
+                upper = thresholds[i - 1][0]
+                margins.append(np.abs(upper - ratios[selected]) / abs(upper - nominal))
+            confidences[selected] = np.clip(np.minimum.reduce(margins), 0, 1)
+
+    return confidences
+
+def determineShapeTypesFromComponents(coloredShapes, min_area=MIN_AREA):
+    '''Same rules as determineShapeTypes, using the size and angle from get_color_component_table
+       (ShapeTable) instead of searching the Contours again.'''
+    rows = coloredShapes.rows
+    
+    # no reliable Orientation for small Components
+    reliable = (rows['area'] >= min_area) & ~np.isnan(rows['size'][:, 0])
+    rows['angle'][~reliable] = np.nan
+    rows['type'][~reliable] = ShapeType.UNDEFINED.value
+    
+    types = classifyByRatios(rows['color'][reliable], rows['size'][reliable])
+    types[types == 0] = ShapeType.UNDEFINED.value
+    rows['type'][reliable] = types
+    rows['confidence'][reliable] = getRatioConfidences(rows['color'][reliable], rows['size'][reliable], types)
+    return coloredShapes
+
+def determineShapeTypes(coloredShapes, color_masks, offset=ROI_OFFSET, min_area=MIN_AREA):  
       
     for coloredShape in coloredShapes:
 
         # cutting out the roi with an offset when possible
-        roi_mask = ic.tryCutRoiWithOffset(coloredShape.roi, 25, color_masks[coloredShape.color])
+        roi_mask = ic.tryCutRoiWithOffset(coloredShape.roi, offset, color_masks[coloredShape.color])
         
         # getting the smallest possible BBox
-        _, mbb_size, angle = getMinBBox(roi_mask) # (inverted angle for reversing rotation of the ROI)
+        _, mbb_size, angle = getMinBBox(roi_mask, min_area) # (inverted angle for reversing rotation of the ROI)
         if mbb_size is None or angle is None:
             continue
         mbb_w, mbb_h = mbb_size
         coloredShape.angle = angle
 
         # identifying the most likely Type for the Shape
-        if coloredShape.color in [LegoColor.BLUE, LegoColor.YELLOW]:
-            ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
-            identifiedType = None
-            if ratio > 3.19:
-                identifiedType = ShapeType.ONE_X_FOUR
-            elif ratio > 2.4: 
-                identifiedType = ShapeType.ONE_X_THREE
-        else:
-            ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
-            if ratio > 1.8:
-                identifiedType = ShapeType.TWO_X_FOUR
-            elif ratio > 0.9: 
-                identifiedType = ShapeType.TWO_X_TWO
+        identifiedType = classifyByRatio(coloredShape.color, mbb_w, mbb_h)
+        coloredShape.confidence = getRatioConfidence(coloredShape.color, identifiedType, mbb_w, mbb_h)
         
         # saving the identified Type into the Shape
         if identifiedType is None:
@@ -110,7 +413,21 @@ def determineShapeTypes(coloredShapes, color_masks):
             
     return coloredShapes
     
-def getMinBBox(roi_mask):
+def correctMinAreaRectAngle(size, angle):
+    '''Angle of a cv2.minAreaRect in [0, 180), 0 for an upright long Side.
+       Angles just below 180 (Rounding of minAreaRect) are folded back to 0.'''
+    w, h = size
+    correctedAngle = angle - 90
+    
+    if w < h:
+        correctedAngle += 90
+    
+    correctedAngle = correctedAngle % 180
+    if correctedAngle > 179.5:
+        correctedAngle = 0.0
+    return correctedAngle
+
+def getMinBBox(roi_mask, min_area=MIN_AREA):
     
     contours, _ = cv2.findContours(roi_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
@@ -120,7 +437,7 @@ def getMinBBox(roi_mask):
     for contour in contours:
         contour_area = cv2.contourArea(contour)
 
-        if(contour_area < 1000):
+        if(contour_area < min_area):
             continue
         
         if contour_area > max_area:
@@ -133,13 +450,7 @@ def getMinBBox(roi_mask):
     center, size, angle = cv2.minAreaRect(best_contour)
     w, h = size
     
-    correctedAngle = angle
-    correctedAngle -= 90
-    
-    if w < h:
-        correctedAngle += 90
-    
-    correctedAngle = correctedAngle % 180
+    correctedAngle = correctMinAreaRectAngle(size, angle)
     
     if w == 0 or h == 0:
         return None, None, correctedAngle
@@ -1,76 +1,151 @@
 import cv2
+import time
 import numpy as np
-import os
 
-from algorithms import getMinBBox
-from dataclasses import LegoColor, ShapeType
+from models.algorithms import getMinBBox, ROI_OFFSET, MIN_AREA
+from models.dataclasses import LegoColor, ShapeType
 from utils import imageConverter
 
+# Showing and printing every single Match
+debug = False
+
+# Candidate Types per Color in matching order and their thresholds
+# (a 1x4 Template still reaches 0.54 on a 1x3 Brick, a 1x3 Template up to 0.89 on a 1x4 Brick)
+TEMPLATE_THRESHOLDS = {
+    LegoColor.RED: [(ShapeType.TWO_X_FOUR, 0.17), (ShapeType.TWO_X_TWO, 0.17)],
+    LegoColor.GREEN: [(ShapeType.TWO_X_FOUR, 0.19), (ShapeType.TWO_X_TWO, 0.17)],
+    LegoColor.YELLOW: [(ShapeType.ONE_X_FOUR, 0.7), (ShapeType.ONE_X_THREE, 0.25)],
+    LegoColor.BLUE: [(ShapeType.ONE_X_FOUR, 0.6), (ShapeType.ONE_X_THREE, 0.27)]
+}
+
 # TEMPLATE MATCHING
-def determineShapeTypesWithTemplateMatching(coloredShapes, image, color_masks):
+def determineShapeTypesWithTemplateMatching(coloredShapes, image, color_masks, bank):
+    '''bank: TemplateBank holding the preloaded and rotated Templates'''
+    image_gray = imageConverter.convertToGray(image) if len(image.shape) == 3 else image
+    
     for coloredShape in coloredShapes:
-
-            # cutting out the roi with an offset when possible
-            roi = imageConverter.tryCutRoiWithOffset(coloredShape.roi, 25, image)
-            roi_mask = imageConverter.tryCutRoiWithOffset(coloredShape.roi, 25, color_masks[coloredShape.color])
-            
-            mbb_size, correctedAngle = getMinBBox(roi_mask) # (inverted angle for reversing rotation of the ROI)
-            
-            if mbb_size != None:
-                mbb_w, mbb_h = mbb_size
-            else:
-                mbb_w = 1
-                mbb_h = 1
-            
-            coloredShape.angle = correctedAngle
-
-            # identifying the most likely Type for the Shape
-            if coloredShape.color in [LegoColor.BLUE, LegoColor.YELLOW]:
-                identifiedType = getMostLikelyType(coloredShape.color, ShapeType.ONE_X_FOUR, 
-                                                   ShapeType.ONE_X_THREE, roi, correctedAngle)
-                if identifiedType is None:
-                    ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
-                    if ratio > 3.5:
-                        identifiedType = ShapeType.ONE_X_FOUR
-                    elif ratio > 2.5: 
-                        identifiedType = ShapeType.ONE_X_THREE
-            else:
-                identifiedType = getMostLikelyType(coloredShape.color, ShapeType.TWO_X_FOUR, 
-                                                   ShapeType.TWO_X_TWO, roi, correctedAngle)
-                if identifiedType is None:
-                    ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
-                    if ratio > 1.5:
-                        identifiedType = ShapeType.TWO_X_FOUR
-                    elif ratio > 0.5: 
-                        identifiedType = ShapeType.TWO_X_TWO
-            
-            # saving the identified Type into the Shape
-            if identifiedType is None:
-                coloredShape.shapeType = ShapeType.UNDEFINED
-            else:
-                coloredShape.shapeType = identifiedType
+        determineShapeTypeWithTemplateMatching(coloredShape, image_gray, color_masks, bank)
                 
     return coloredShapes
 
-def applyTemplateMatching(roi, path_to_template, threshold, angle):
+def determineShapeTypesWithTemplateMatchingBatched(coloredShapes, image, color_masks, bank, executor=None, order=None,
+                                                   deadline=None, match_time=0.0, offset=ROI_OFFSET, min_area=MIN_AREA):
+    '''Matches the Shapes (ShapeTable) of the Frame with matchShapeType, in parallel on the executor
+       (e.g. a ThreadPoolExecutor, OpenCV releases the GIL during matchTemplate) or on the calling Thread.\n
+       order: Indices of the Shapes to match in this order, all Shapes by default.
+       deadline: time.perf_counter() Value, no Match is started that would overrun it by match_time Seconds.
+       Returns per Index of the order (Type, Score, Angle, Seconds) or None when the Shape was skipped,
+       and the matching time of the Frame in seconds.'''
+    start = time.perf_counter()
+    rows = coloredShapes.rows
+    order = range(len(rows)) if order is None else order
+    image_gray = imageConverter.convertToGray(image) if len(image.shape) == 3 else image
+
+    def match(i):
+        match_start = time.perf_counter()
+        if deadline is not None and match_start + match_time > deadline:
+            return None
+        color = coloredShapes[int(i)].color
+        shapeType, score, angle = matchShapeType(color, rows['roi'][i].tolist(), image_gray, color_masks[color],
+                                                 bank, offset, min_area)
+        return shapeType, score, angle, time.perf_counter() - match_start
+
+    if executor is None:
+        matches = [match(i) for i in order]
+    else:
+        matches = list(executor.map(match, order))
+
+    return matches, time.perf_counter() - start
+
+def determineShapeTypeWithTemplateMatching(coloredShape, image_gray, color_masks, bank):
+
+    # cutting out the roi with an offset when possible
+    roi = imageConverter.tryCutRoiWithOffset(coloredShape.roi, ROI_OFFSET, image_gray)
+    roi_mask = imageConverter.tryCutRoiWithOffset(coloredShape.roi, ROI_OFFSET, color_masks[coloredShape.color])
+    
+    _, mbb_size, correctedAngle = getMinBBox(roi_mask) # (inverted angle for reversing rotation of the ROI)
     
-    # Load Template and convert both to Grayscale
-    template = cv2.imread(path_to_template, cv2.IMREAD_GRAYSCALE)
-    roi_gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if len(roi.shape) == 3 else roi
+    if mbb_size != None:
+        mbb_w, mbb_h = mbb_size
+    else:
+        mbb_w = 1
+        mbb_h = 1
     
-    rotated_roi = rotate_image(roi_gray, angle)
-    padded_roi = pad_roi_if_needed(rotated_roi, template)
+    coloredShape.angle = correctedAngle
+
+    # identifying the most likely Type for the Shape
+    if coloredShape.color in [LegoColor.BLUE, LegoColor.YELLOW]:
+        identifiedType = getMostLikelyType(coloredShape.color, ShapeType.ONE_X_FOUR, 
+                                           ShapeType.ONE_X_THREE, roi, correctedAngle, bank)
+        if identifiedType is None:
+            ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
+            if ratio > 3.5:
+                identifiedType = ShapeType.ONE_X_FOUR
+            elif ratio > 2.5: 
+                identifiedType = ShapeType.ONE_X_THREE
+    else:
+        identifiedType = getMostLikelyType(coloredShape.color, ShapeType.TWO_X_FOUR, 
+                                           ShapeType.TWO_X_TWO, roi, correctedAngle, bank)
+        if identifiedType is None:
+            ratio = max(mbb_w, mbb_h) / min(mbb_w, mbb_h)
+            if ratio > 1.5:
+                identifiedType = ShapeType.TWO_X_FOUR
+            elif ratio > 0.5: 
+                identifiedType = ShapeType.TWO_X_TWO
     
-    cv2.imshow('TEMPLATE', template)
-    cv2.imshow('ROI', padded_roi)
+    # saving the identified Type into the Shape
+    if identifiedType is None:
+        coloredShape.shapeType = ShapeType.UNDEFINED
+    else:
+        coloredShape.shapeType = identifiedType
+
+    return coloredShape
+
+def applyTemplateMatching(roi_gray, template, threshold):
+    '''template: grayscale Template, already rotated by the ROIs angle (see TemplateBank)'''
+    if template is None:
+        return False
+
+    # determine the boolean Value
+    return getMatchScore(roi_gray, template) >= threshold
+
+def getMatchScore(roi_gray, template):
+    '''Best normalized Correlation (TM_CCOEFF_NORMED) of the Template inside the ROI.'''
+    padded_roi = pad_roi_if_needed(roi_gray, template)
     
     result = cv2.matchTemplate(padded_roi, template, cv2.TM_CCOEFF_NORMED)
     max_val = cv2.minMaxLoc(result)[1]
     
-    print(f'{path_to_template.split('/')[-1]} - Max Value: {max_val}')
-
-    # determine the boolean Value
-    return max_val >= threshold
+    if debug:
+        cv2.imshow('TEMPLATE', template)
+        cv2.imshow('ROI', padded_roi)
+        print(f'Template {template.shape[1]}x{template.shape[0]} - Max Value: {max_val}')
+
+    return max_val
+
+def matchShapeType(color, roi, image_gray, color_mask, bank, offset=ROI_OFFSET, min_area=MIN_AREA):
+    '''Matches the Templates of the Candidate Types of the Color (TEMPLATE_THRESHOLDS), starting with the greatest one.\n
+       The Templates are rotated by the Angle of the minimal BBox in the Color Mask.
+       Returns the first matching Type and its Score or None and the best Score (None without Templates),
+       and the Angle (None when the Mask holds no Contour large enough).'''
+    roi_gray = imageConverter.tryCutRoiWithOffset(roi, offset, image_gray)
+    roi_mask = imageConverter.tryCutRoiWithOffset(roi, offset, color_mask)
+    _, _, angle = getMinBBox(roi_mask, min_area)
+    best_score = None
+    
+    for shapeType, threshold in TEMPLATE_THRESHOLDS.get(color, []):
+        template = bank.get(color, shapeType, angle)
+        if template is None:
+            continue
+        
+        score = getMatchScore(roi_gray, template)
+        # no further Matching once the Type is decided
+        if score >= threshold:
+            return shapeType, score, angle
+        if best_score is None or score > best_score:
+            best_score = score
+    
+    return None, best_score, angle
 
 def pad_roi_if_needed(roi, template):
     """Adds black pixels to the ROI, in case that the Template is bigger than the ROI."""
@@ -112,62 +187,18 @@ def rotate_image(image, angle):
     # Apply Rotation-Matrix
     return cv2.warpAffine(image, M, (new_w, new_h), flags=cv2.INTER_CUBIC)
 
-def getMostLikelyType(color, typeA, typeB, roi, angle):
-
-    greatest_type = max(typeA, typeB)
-    path = os.path.join('assets', 'd02_templates_s')
-
-    match greatest_type:
-        case ShapeType.TWO_X_FOUR:
-
-            # Specifying the threshold-value for the Colors Red and Green
-            match color:
-                case LegoColor.RED:
-                    thresh_2x4 = 0.17
-                    thresh_2x2 = 0.17
-                case LegoColor.GREEN:
-                    thresh_2x4 = 0.19
-                    thresh_2x2 = 0.17
-
-            filename = f'2x4_{color.__str__().lower()}.jpg'
-            match = applyTemplateMatching(roi, os.path.join(path, filename), thresh_2x4, angle)
-
-            if match:
-                return ShapeType.TWO_X_FOUR
-
-            filename = f'2x2_{color.__str__().lower()}.jpg'
-            match = applyTemplateMatching(roi, os.path.join(path, filename), thresh_2x2, angle)
-
-            if match:
-                return ShapeType.TWO_X_TWO
-
-            return None
-
-        case ShapeType.ONE_X_FOUR:
-
-            # Specifying the threshold-value for the Colors Blue and Yellow
-            match color:
-                case LegoColor.YELLOW:
-                    thresh_1x4 = 0.221
-                    thresh_1x3 = 0.25
-                case LegoColor.BLUE:
-                    thresh_1x4 = 0.3
-                    thresh_1x3 = 0.27
-
-            filename = f'1x4_{color.__str__().lower()}.jpg'
-            match = applyTemplateMatching(roi, os.path.join(path, filename), thresh_1x4, angle)
-
-            if match:
-                return ShapeType.ONE_X_FOUR
-
-            filename = f'1x3_{color.__str__().lower()}.jpg'
-            match = applyTemplateMatching(roi, os.path.join(path, filename), thresh_1x3, angle)
-
-            if match:
-                return ShapeType.ONE_X_THREE
-            
-            return None
+def getMostLikelyType(color, typeA, typeB, roi, angle, bank):
+    '''Matches the Templates of both Types, starting with the greatest one.\n
+       Returns the first matching Type or None.'''
+    
+    for shapeType, threshold in TEMPLATE_THRESHOLDS.get(color, []):
+        if shapeType not in (typeA, typeB):
+            continue
         
-        case _:
-            return None
+        template = bank.get(color, shapeType, angle)
         
+        # no further Matching once the Type is decided
+        if applyTemplateMatching(roi, template, threshold):
+            return shapeType
+    
+    return None
@@ -0,0 +1,50 @@
+import os
+import hashlib
+import numpy as np
+
+import models.algorithms as alg
+
+# Raise when the Layout of the Cache Files changes
+LUT_VERSION = 1
+
+def buildColorLUT(background_range, color_ranges, bits):
+    '''Compiles the Ranges into a LUT mapping every quantized BGR-Value
+       (bits per channel) to its Segmentation Code.'''
+    levels = 1 << bits
+    shift = 8 - bits
+
+    # using the center of every quantization bin
+    values = (np.arange(levels, dtype=np.uint16) << shift) + ((1 << shift) >> 1)
+    values = values.astype(np.uint8)
+
+    # every BGR combination as an image with (levels * levels) rows and levels columns
+    b, g, r = np.meshgrid(values, values, values, indexing='ij')
+    bgr = np.stack((b, g, r), axis=-1).reshape(levels * levels, levels, 3)
+
+    codes = alg.getSegmentationCodes(bgr, background_range, color_ranges)
+    return codes.reshape(-1)
+
+def getColorLUTPath(cache_dir, background_range, color_ranges, bits):
+    range_keys = [color_range.key() for color_range in [background_range] + color_ranges]
+    digest = hashlib.sha1(repr((range_keys, bits)).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'color_lut_v{LUT_VERSION}_{bits}bit_{digest}.npy')
+
+def loadColorLUT(cache_dir, background_range, color_ranges, bits=7):
+    '''Returns the memory-mapped LUT for the Ranges.\n
+       The LUT is only rebuilt when no Cache File for the Ranges exists.'''
+    if not 1 <= bits <= 8:
+        raise ValueError(f'LUT bits have to be between 1 and 8, got {bits}.')
+
+    path = getColorLUTPath(cache_dir, background_range, color_ranges, bits)
+
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        color_lut = buildColorLUT(background_range, color_ranges, bits)
+
+        # writing into a temporary File first, so no partial Cache File can be loaded
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.save(file, color_lut)
+        os.replace(tmp_path, path)
+
+    return np.load(path, mmap_mode='r')
@@ -34,14 +34,38 @@ class ShapeType(Enum):
         return -1
 
 
+class ColorRange:
+    '''lower / higher: [Hue, Sat, Val]\n
+       A lower Hue greater than the higher Hue wraps around (e.g. red).'''
+
+    def __init__(self, color: LegoColor, lower, higher, kernalSize):
+        self.color = color
+        self.lower = lower
+        self.higher = higher
+        self.kernalSize = kernalSize
+
+    def key(self):
+        color_value = None if self.color is None else self.color.value
+        return (color_value, tuple(self.lower), tuple(self.higher), self.kernalSize)
+
+
 class ColoredShape:
 
-    def __init__(self, pos, roi, color: LegoColor, shapeType: ShapeType, angle):
+    def __init__(self, pos, roi, color: LegoColor, shapeType: ShapeType, angle, area=None, size=None):
         self.pos = pos
         self.roi = roi
         self.color = color
         self.shapeType = shapeType
         self.angle = angle
+        # pixel area and (short side, long side) from the connected Components
+        self.area = area
+        self.size = size
+        # stable ID across Frames (see ShapeTracker), None without Tracking
+        self.trackId = None
+        # Index of the Camera in merged multi-camera Streams, None otherwise
+        self.camera = None
+        # Confidence (0..1) of the Shape Type, None when unclassified
+        self.confidence = None
 
     def __str__(self):
         
@@ -0,0 +1,201 @@
+import cv2
+import numpy as np
+
+import models.algorithms as alg
+import utils.profiler as profiling
+from models.shapeTable import ShapeTable
+from models.shapeTracker import getIoU
+
+class DetectionResult:
+
+    def __init__(self, frame, foreground_mask, label_map, color_masks, cleaned_masks, coloredShapes):
+        self.frame = frame
+        self.foreground_mask = foreground_mask
+        self.label_map = label_map
+        self.color_masks = color_masks
+        self.cleaned_masks = cleaned_masks
+        self.coloredShapes = coloredShapes
+        # Capture Time of the Frame (time.time()) and its Index in Capture Order, set by the Program
+        self.timestamp = None
+        self.frame_index = None
+
+    def getSeperatedImage(self, color):
+        '''Color seperated Image of the Frame, only built on request (e.g. for the Windows).'''
+        return cv2.bitwise_and(self.frame, self.frame, mask=self.cleaned_masks[color])
+
+
+class Detector:
+    '''Runs the Detection Chain on cropped Frames.\n
+       Holds no per-Frame State, so one Detector can be shared between Threads.
+       scale: Processing Scale, the Chain runs on Frames resized by scaleFrame. min_pixel_count,
+       min_area and the Kernel Sizes of the Ranges are given at full Resolution and scaled with it
+       (see alg.scaleKernalSize), the Positions stay in the unit square.
+       refine: Coarse-to-fine, the BBox, sides and angle of every Shape are measured again
+       at full Resolution inside its ROI (see refineShapes).'''
+
+    def __init__(self, color_lut=None, background_range=alg.BACKGROUND_RANGE,
+                 color_ranges=alg.COLOR_RANGES, min_pixel_count=alg.MIN_PIXEL_COUNT, min_area=alg.MIN_AREA,
+                 classifier=None, scale=1.0, refine=False):
+        self.color_lut = color_lut
+        self.scale = scale
+        # Ranges with the Kernel Sizes at the Processing Scale, the given ones for the Refinement
+        self.background_range = alg.scaleColorRange(background_range, scale)
+        self.color_ranges = [alg.scaleColorRange(color_range, scale) for color_range in color_ranges]
+        self.full_background_range = background_range
+        self.full_color_ranges = color_ranges
+        self.refine = refine and scale != 1
+        self.min_pixel_count = min_pixel_count * scale ** 2
+        self.min_area = min_area * scale ** 2
+        # the Refinement works at full Resolution
+        self.full_min_area = min_area
+        self.kernal_sizes = {color_range.color: color_range.kernalSize for color_range in color_ranges}
+        # refining the Aspect Ratio Classification, e.g. a TemplateClassifier
+        self.classifier = classifier
+
+    def scaleFrame(self, frame_cropped):
+        '''Returns the cropped Frame at the Processing Scale (the Frame itself at scale 1).'''
+        if self.scale == 1:
+            return frame_cropped
+        return cv2.resize(frame_cropped, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def segment(self, frame_cropped, full_resolution=False):
+        '''Returns the Foreground Mask and the Label Map of the Frame.\n
+           full_resolution: the Frame is not scaled (Refinement), the Kernels keep their given Size.'''
+        background_range = self.full_background_range if full_resolution else self.background_range
+        if self.color_lut is not None:
+            return alg.segmentColorsWithLUT(frame_cropped, self.color_lut, background_range.kernalSize)
+        color_ranges = self.full_color_ranges if full_resolution else self.color_ranges
+        return alg.segmentColors(frame_cropped, background_range, color_ranges)
+
+    def separate(self, label_map, profiler=profiling.DISABLED):
+        '''Returns the color-specific Masks and the Masks cleaned by opening and closing.'''
+        color_masks = {color_range.color: alg.getColorMask(label_map, color_range.color)
+                       for color_range in self.color_ranges}
+        profiler.lap('color masks')
+        cleaned_masks = alg.cleanColorMasks(label_map, self.color_ranges)
+        profiler.lap('morphology')
+        return color_masks, cleaned_masks
+
+    def extractShapes(self, frame_cropped, cleaned_masks, frame_full=None):
+        '''frame_full: the cropped Frame at full Resolution, only needed for the Refinement.'''
+        # labeling the color-specific Components (bbox, area and orientation in one pass)
+        coloredShapes = alg.get_color_component_table(cleaned_masks, self.min_area)
+
+        # Filtering out all Shapes with a total pixel Count below the minimum
+        coloredShapes = alg.filterShapesByPixelCount(coloredShapes, self.min_pixel_count)
+
+        # determining the Shapes positions in the unit square
+        coloredShapes = alg.determineShapePositions(coloredShapes, frame_cropped)
+
+        if self.refine and frame_full is not None:
+            coloredShapes = self.refineShapes(coloredShapes, frame_full)
+        return coloredShapes
+
+    def refineShapes(self, coloredShapes, frame_full):
+        '''Segments the full-resolution Frame only inside the ROI (plus alg.ROI_OFFSET) of every Shape
+           and takes the BBox, area, sides and angle of the Component overlapping the Shape most.
+           The Values are converted back to the Processing Scale, the Positions keep the full Precision.'''
+        rows = coloredShapes.rows
+        full_h, full_w = frame_full.shape[:2]
+        length = min(full_h, full_w)
+
+        for i in range(len(rows)):
+            x, y, w, h = (rows['roi'][i] / self.scale).tolist()
+            x0, y0 = max(int(x) - alg.ROI_OFFSET, 0), max(int(y) - alg.ROI_OFFSET, 0)
+            x1, y1 = min(int(np.ceil(x + w)) + alg.ROI_OFFSET, full_w), min(int(np.ceil(y + h)) + alg.ROI_OFFSET, full_h)
+
+            color = coloredShapes[i].color
+            _, label_region = self.segment(frame_full[y0:y1, x0:x1], full_resolution=True)
+            mask = alg.cleanMask(alg.getColorMask(label_region, color), self.kernal_sizes[color])
+            stats, _, sizes, angles = alg.labelColorMask(mask, self.full_min_area)
+            if len(stats) == 0:
+                continue
+
+            # neighbouring Bricks of the same Color may reach into the Region
+            overlap = getIoU(stats[:, :4] + [x0, y0, 0, 0], [x, y, w, h])
+            best = int(np.argmax(overlap))
+            if overlap[best] == 0:
+                continue
+
+            bx, by, bw, bh, area = stats[best].tolist()
+            bx, by = bx + x0, by + y0
+            rows['roi'][i] = np.round(np.array([bx, by, bw, bh]) * self.scale)
+            rows['area'][i] = round(area * self.scale ** 2)
+            rows['size'][i] = sizes[best] * self.scale
+            rows['angle'][i] = angles[best]
+            rows['pos'][i] = ((bx + bw // 2) / length, (by + bh // 2) / length)
+
+        return coloredShapes
+
+    def classify(self, coloredShapes, frame_cropped, color_masks, profiler=profiling.DISABLED):
+        # identifying the Shape Types from the Component sizes
+        coloredShapes = alg.determineShapeTypesFromComponents(coloredShapes, self.min_area)
+        if self.classifier is not None:
+            coloredShapes = self.classifier.classify(coloredShapes, frame_cropped, color_masks, profiler)
+        return coloredShapes
+
+    def detect(self, frame_cropped, profiler=profiling.DISABLED, tracker=None, frame_full=None, frame_index=None):
+        '''frame_cropped: Frame at the Processing Scale (see scaleFrame), frame_full: the same Frame
+           at full Resolution for the Refinement. tracker: optional ShapeTracker, then only
+           new or changed Shapes are classified. frame_index: Capture Order of the Frame for the Tracker.'''
+        foreground_mask, label_map = self.segment(frame_cropped)
+        profiler.lap('segmentation')
+        color_masks, cleaned_masks = self.separate(label_map, profiler)
+        coloredShapes = self.extractShapes(frame_cropped, cleaned_masks, frame_full)
+        profiler.lap('roi extraction')
+        if tracker is None:
+            coloredShapes = self.classify(coloredShapes, frame_cropped, color_masks, profiler)
+        else:
+            coloredShapes = tracker.track(coloredShapes, lambda shapes: self.classify(shapes, frame_cropped, color_masks, profiler),
+                                          frame_index)
+        profiler.lap('classification')
+
+        return DetectionResult(frame_cropped, foreground_mask, label_map,
+                               color_masks, cleaned_masks, coloredShapes)
+
+    def detectRegion(self, frame_cropped, region, previous, profiler=profiling.DISABLED, tracker=None, frame_full=None,
+                     frame_index=None):
+        '''Runs the Detection Chain only inside the Region (x, y, w, h) and keeps the previous
+           Result (DetectionResult) outside of it. The Region must contain every previous Shape it touches.'''
+        x, y, w, h = region
+        frame_region = frame_cropped[y:y+h, x:x+w]
+
+        foreground_region, label_region = self.segment(frame_region)
+        profiler.lap('segmentation')
+        color_region, cleaned_region = self.separate(label_region, profiler)
+
+        # Shapes of the Region in Frame Coordinates
+        regionShapes = alg.get_color_component_table(cleaned_region, self.min_area)
+        regionShapes.rows['roi'][:, 0] += x
+        regionShapes.rows['roi'][:, 1] += y
+        regionShapes = alg.filterShapesByPixelCount(regionShapes, self.min_pixel_count)
+        regionShapes = alg.determineShapePositions(regionShapes, frame_cropped)
+        if self.refine and frame_full is not None:
+            regionShapes = self.refineShapes(regionShapes, frame_full)
+
+        # pasting the Region into Copies of the previous Masks
+        def paste(previous_mask, mask_region):
+            mask = previous_mask.copy()
+            mask[y:y+h, x:x+w] = mask_region
+            return mask
+        foreground_mask = paste(previous.foreground_mask, foreground_region)
+        label_map = paste(previous.label_map, label_region)
+        color_masks = {color: paste(previous.color_masks[color], color_region[color]) for color in color_region}
+        cleaned_masks = {color: paste(previous.cleaned_masks[color], cleaned_region[color]) for color in cleaned_region}
+        profiler.lap('roi extraction')
+
+        # previous Shapes outside of the Region keep their Classification
+        rois = previous.coloredShapes.rows['roi']
+        outside = (rois[:, 0] >= x + w) | (rois[:, 0] + rois[:, 2] <= x) | \
+                  (rois[:, 1] >= y + h) | (rois[:, 1] + rois[:, 3] <= y)
+        if tracker is None:
+            regionShapes = self.classify(regionShapes, frame_cropped, color_masks, profiler)
+            coloredShapes = ShapeTable.concatenate([previous.coloredShapes[outside], regionShapes])
+        else:
+            coloredShapes = ShapeTable.concatenate([previous.coloredShapes[outside], regionShapes])
+            coloredShapes = tracker.track(coloredShapes, lambda shapes: self.classify(shapes, frame_cropped, color_masks, profiler),
+                                          frame_index)
+        profiler.lap('classification')
+
+        return DetectionResult(frame_cropped, foreground_mask, label_map,
+                               color_masks, cleaned_masks, coloredShapes)
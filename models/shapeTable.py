@@ -0,0 +1,180 @@
+import numpy as np
+
+from models.dataclasses import LegoColor, ShapeType, ColoredShape
+
+# Columns of the ShapeTable, missing Values are stored as 0 (color, type), -1 (area, id, camera) or NaN
+# confidence: 0..1 of the Classification (Template Score or Ratio Margin, see TemplateClassifier)
+SHAPE_DTYPE = np.dtype([
+    ('roi', np.int32, 4),
+    ('pos', np.float64, 2),
+    ('color', np.uint8),
+    ('type', np.uint8),
+    ('angle', np.float64),
+    ('area', np.int64),
+    ('size', np.float64, 2),
+    ('id', np.int32),
+    ('camera', np.int16),
+    ('confidence', np.float64)
+])
+
+_COLORS = {color.value: color for color in LegoColor}
+_SHAPE_TYPES = {shapeType.value: shapeType for shapeType in ShapeType}
+
+
+class ShapeRow:
+    '''View on one Row of a ShapeTable with the Attributes of ColoredShape.\n
+       Writing an Attribute writes into the Table.'''
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def roi(self):
+        x, y, w, h = self.table.rows['roi'][self.index].tolist()
+        return (x, y, w, h)
+
+    @roi.setter
+    def roi(self, roi):
+        self.table.rows['roi'][self.index] = roi
+
+    @property
+    def pos(self):
+        x, y = self.table.rows['pos'][self.index].tolist()
+        return None if np.isnan(x) else (x, y)
+
+    @pos.setter
+    def pos(self, pos):
+        self.table.rows['pos'][self.index] = (np.nan, np.nan) if pos is None else pos
+
+    @property
+    def color(self):
+        return _COLORS.get(int(self.table.rows['color'][self.index]))
+
+    @color.setter
+    def color(self, color):
+        self.table.rows['color'][self.index] = 0 if color is None else color.value
+
+    @property
+    def shapeType(self):
+        return _SHAPE_TYPES.get(int(self.table.rows['type'][self.index]))
+
+    @shapeType.setter
+    def shapeType(self, shapeType):
+        self.table.rows['type'][self.index] = 0 if shapeType is None else shapeType.value
+
+    @property
+    def angle(self):
+        angle = float(self.table.rows['angle'][self.index])
+        return None if np.isnan(angle) else angle
+
+    @angle.setter
+    def angle(self, angle):
+        self.table.rows['angle'][self.index] = np.nan if angle is None else angle
+
+    @property
+    def area(self):
+        area = int(self.table.rows['area'][self.index])
+        return None if area < 0 else area
+
+    @area.setter
+    def area(self, area):
+        self.table.rows['area'][self.index] = -1 if area is None else area
+
+    @property
+    def size(self):
+        short_side, long_side = self.table.rows['size'][self.index].tolist()
+        return None if np.isnan(short_side) else (short_side, long_side)
+
+    @size.setter
+    def size(self, size):
+        self.table.rows['size'][self.index] = (np.nan, np.nan) if size is None else size
+
+    @property
+    def trackId(self):
+        trackId = int(self.table.rows['id'][self.index])
+        return None if trackId < 0 else trackId
+
+    @trackId.setter
+    def trackId(self, trackId):
+        self.table.rows['id'][self.index] = -1 if trackId is None else trackId
+
+    @property
+    def camera(self):
+        camera = int(self.table.rows['camera'][self.index])
+        return None if camera < 0 else camera
+
+    @camera.setter
+    def camera(self, camera):
+        self.table.rows['camera'][self.index] = -1 if camera is None else camera
+
+    @property
+    def confidence(self):
+        confidence = float(self.table.rows['confidence'][self.index])
+        return None if np.isnan(confidence) else confidence
+
+    @confidence.setter
+    def confidence(self, confidence):
+        self.table.rows['confidence'][self.index] = np.nan if confidence is None else confidence
+
+    __str__ = ColoredShape.__str__
+
+
+class ShapeTable:
+    '''All Shapes of a Frame as one structured Array (see SHAPE_DTYPE).\n
+       Iterating or indexing with an int yields ShapeRows, so the Table can be used
+       like a List of ColoredShapes. Indexing with a Mask or Index Array yields a new Table.'''
+
+    def __init__(self, rows=None):
+        self.rows = np.zeros(0, dtype=SHAPE_DTYPE) if rows is None else rows
+
+    @classmethod
+    def empty(cls, count):
+        '''Table of count Rows with every Value missing.'''
+        rows = np.zeros(count, dtype=SHAPE_DTYPE)
+        rows['pos'] = np.nan
+        rows['angle'] = np.nan
+        rows['area'] = -1
+        rows['size'] = np.nan
+        rows['id'] = -1
+        rows['camera'] = -1
+        rows['confidence'] = np.nan
+        return cls(rows)
+
+    @classmethod
+    def concatenate(cls, tables):
+        if len(tables) == 0:
+            return cls()
+        return cls(np.concatenate([table.rows for table in tables]))
+
+    @classmethod
+    def fromColoredShapes(cls, coloredShapes):
+        table = cls.empty(len(coloredShapes))
+        for row, coloredShape in zip(table, coloredShapes):
+            row.roi = coloredShape.roi
+            row.pos = coloredShape.pos
+            row.color = coloredShape.color
+            row.shapeType = coloredShape.shapeType
+            row.angle = coloredShape.angle
+            row.area = getattr(coloredShape, 'area', None)
+            row.size = getattr(coloredShape, 'size', None)
+            row.trackId = getattr(coloredShape, 'trackId', None)
+            row.camera = getattr(coloredShape, 'camera', None)
+            row.confidence = getattr(coloredShape, 'confidence', None)
+        return table
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (ShapeRow(self, i) for i in range(len(self.rows)))
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self.rows)
+            if not 0 <= index < len(self.rows):
+                raise IndexError('ShapeTable index out of range')
+            return ShapeRow(self, int(index))
+        return ShapeTable(self.rows[index])
@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+
+from models.shapeTable import ShapeTable
+
+def getIoU(rois_a, rois_b):
+    '''Elementwise IoU of two (broadcastable) Arrays of BBoxes (..., 4) as x, y, w, h.'''
+    a = np.asarray(rois_a, dtype=np.float64)
+    b = np.asarray(rois_b, dtype=np.float64)
+    inter_w = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    inter_h = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    intersection = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def getIoUMatrix(rois_a, rois_b):
+    '''IoU of every BBox in rois_a (n x 4) with every BBox in rois_b (m x 4) as n x m Matrix.'''
+    return getIoU(rois_a[:, None, :], rois_b[None, :, :])
+
+
+class ShapeTracker:
+    '''Associates the Shapes of consecutive Frames by the IoU of their BBoxes (same Color only).\n
+       Matched Shapes keep the stable ID of their Track and, while they did not change significantly
+       since their last Classification, the cached Type, angle, size and confidence. Only new or changed
+       Shapes are classified again. Tracks survive max_missed Frames without a Detection.
+       With several Workers the Frames may arrive out of Capture Order, Frames older than the
+       last tracked one are only matched and leave the Tracks as they are.'''
+
+    def __init__(self, min_iou=0.3, changed_iou=0.85, changed_area=0.15, max_missed=5):
+        self.min_iou = min_iou
+        self.changed_iou = changed_iou
+        self.changed_area = changed_area
+        self.max_missed = max_missed
+        # Frames of several Workers are tracked one after another
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.tracks = ShapeTable()
+        # BBox and area at the last Classification of every Track
+        self.reference_roi = np.zeros((0, 4), np.int32)
+        self.reference_area = np.zeros(0, np.int64)
+        self.missed = np.zeros(0, np.int32)
+        self.next_id = 1
+        self.last_frame_index = -1
+        self.classified = 0
+        self.reused = 0
+
+    def match(self, shapes):
+        '''Greedy Matching by descending IoU.\n
+           Returns the Track Index per Shape (-1 for new Shapes) and the IoU with the Track.'''
+        rows, tracks = shapes.rows, self.tracks.rows
+        track_index = np.full(len(rows), -1)
+        track_iou = np.zeros(len(rows))
+        if len(rows) == 0 or len(tracks) == 0:
+            return track_index, track_iou
+
+        iou = getIoUMatrix(rows['roi'], tracks['roi'])
+        iou[rows['color'][:, None] != tracks['color'][None, :]] = 0
+
+        shape_candidates, track_candidates = np.nonzero(iou >= self.min_iou)
+        order = np.argsort(-iou[shape_candidates, track_candidates], kind='stable')
+        track_taken = np.zeros(len(tracks), bool)
+        for shape_i, track_i in zip(shape_candidates[order], track_candidates[order]):
+            if track_index[shape_i] >= 0 or track_taken[track_i]:
+                continue
+            track_index[shape_i] = track_i
+            track_iou[shape_i] = iou[shape_i, track_i]
+            track_taken[track_i] = True
+
+        return track_index, track_iou
+
+    def track(self, shapes, classify, frame_index=None):
+        '''shapes: ShapeTable of the Frame, classify: ShapeTable -> classified ShapeTable,
+           frame_index: Capture Order of the Frame (None for Frames tracked in Order).\n
+           Sets the Track IDs and classifies only new or changed Shapes.'''
+        with self.lock:
+            stale = frame_index is not None and frame_index <= self.last_frame_index
+            rows = shapes.rows
+            track_index, _ = self.match(shapes)
+            matched = track_index >= 0
+            matched_tracks = track_index[matched]
+
+            # Changes against the last Classification of the Track
+            changed = np.ones(len(rows), bool)
+            if matched.any():
+                reference_roi = self.reference_roi[matched_tracks]
+                reference_area = self.reference_area[matched_tracks]
+                iou = getIoU(rows['roi'][matched], reference_roi)
+                area_change = np.abs(rows['area'][matched] - reference_area) / np.maximum(reference_area, 1)
+                unclassified = self.tracks.rows['type'][matched_tracks] == 0
+                changed[matched] = (iou < self.changed_iou) | (area_change > self.changed_area) | unclassified
+
+            # Stable IDs
+            ids = np.empty(len(rows), np.int32)
+            ids[matched] = self.tracks.rows['id'][matched_tracks]
+            new_count = int((~matched).sum())
+            ids[~matched] = np.arange(self.next_id, self.next_id + new_count)
+            self.next_id += new_count
+            rows['id'] = ids
+
+            # Cached Classification of unchanged Tracks
+            reuse = matched & ~changed
+            cached = self.tracks.rows[track_index[reuse]]
+            rows['type'][reuse] = cached['type']
+            rows['angle'][reuse] = cached['angle']
+            rows['size'][reuse] = cached['size']
+            rows['confidence'][reuse] = cached['confidence']
+
+            if changed.any():
+                rows[changed] = classify(shapes[changed]).rows
+
+            self.classified += int(changed.sum())
+            self.reused += int(reuse.sum())
+            if stale:
+                return shapes
+            if frame_index is not None:
+                self.last_frame_index = frame_index
+
+            # References are only renewed by a Classification
+            reference_roi = rows['roi'].copy()
+            reference_area = rows['area'].copy()
+            reference_roi[reuse] = self.reference_roi[track_index[reuse]]
+            reference_area[reuse] = self.reference_area[track_index[reuse]]
+
+            # keeping unmatched Tracks for a few Frames
+            lost = np.ones(len(self.tracks), bool)
+            lost[matched_tracks] = False
+            lost &= self.missed < self.max_missed
+
+            self.tracks = ShapeTable(np.concatenate([rows.copy(), self.tracks.rows[lost]]))
+            self.reference_roi = np.concatenate([reference_roi, self.reference_roi[lost]])
+            self.reference_area = np.concatenate([reference_area, self.reference_area[lost]])
+            self.missed = np.concatenate([np.zeros(len(rows), np.int32), self.missed[lost] + 1])
+
+        return shapes
@@ -0,0 +1,43 @@
+import os
+import cv2
+
+from models.dataclasses import LegoColor, ShapeType
+from models.algorithms_tm import rotate_image
+
+class TemplateBank:
+    '''Grayscale Templates and their rotated Variants, loaded once at startup.\n
+       Files are named <shape type>_<color>.jpg, e.g. 2x4_red.jpg.
+       scale: Processing Scale of the Frames (see Detector), the Templates are resized alike.'''
+
+    def __init__(self, path=os.path.join('assets', 'd02_templates_s'), angle_step=5, scale=1.0):
+        self.angle_step = angle_step
+        self.scale = scale
+        self.rotation_count = max(1, round(180 / angle_step))
+        self.templates = {}
+
+        shape_types = {str(shapeType): shapeType for shapeType in ShapeType}
+
+        for filename in sorted(os.listdir(path)):
+            name, _ = os.path.splitext(filename)
+            shape_name, _, color_name = name.partition('_')
+            if shape_name not in shape_types or color_name.upper() not in LegoColor.__members__:
+                continue
+
+            template = cv2.imread(os.path.join(path, filename), cv2.IMREAD_GRAYSCALE)
+            if template is None:
+                continue
+            if scale != 1:
+                template = cv2.resize(template, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+            # Rotating the Template against the angle equals rotating the ROI by the angle
+            rotations = [rotate_image(template, -i * self.angle_step) for i in range(self.rotation_count)]
+            self.templates[(LegoColor[color_name.upper()], shape_types[shape_name])] = rotations
+
+    def get(self, color, shapeType, angle):
+        '''Returns the Template rotated by the nearest Angle step or None.'''
+        rotations = self.templates.get((color, shapeType))
+        if rotations is None:
+            return None
+        if angle is None:
+            return rotations[0]
+        return rotations[round(angle / self.angle_step) % self.rotation_count]
@@ -0,0 +1,105 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import models.algorithms as alg
+import models.algorithms_tm as tm
+import utils.profiler as profiling
+from models.templateBank import TemplateBank
+
+
+class TemplateClassifier:
+    '''Refines the Aspect Ratio Classification (see alg.determineShapeTypesFromComponents)
+       by Template Matching within a Time Budget per Frame.\n
+       The Shapes are matched starting with the lowest Ratio Confidence, so the ambiguous Shapes
+       come first. Shapes that could not be matched in time, or that no Template matched,
+       keep the Type and Confidence of their Aspect Ratio.
+       A matched Shape gets the Template Score (TM_CCOEFF_NORMED) as Confidence and the Angle
+       of its minimal BBox, which is also defined for square Bricks.
+       The Shapes are matched by algorithms_tm.determineShapeTypesWithTemplateMatchingBatched.
+       budget: Seconds per Frame, 0 for no Limit. threads: Matching Threads, 0 matches on the calling Thread.
+       scale: Processing Scale of the Frames (see Detector), scales the Pixel Thresholds and the default Templates.'''
+
+    def __init__(self, bank=None, budget=0.02, threads=0, scale=1.0):
+        self.bank = TemplateBank(scale=scale) if bank is None else bank
+        self.budget = budget
+        self.offset = round(alg.ROI_OFFSET * scale)
+        self.min_area = alg.MIN_AREA * scale ** 2
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='template-matching') if threads > 0 else None
+        # running Mean of the Matching Time of one Shape over the previous Frames,
+        # no Match is started that would overrun the Budget
+        self.match_time = 0.0
+
+        # Detectors are shared between the Workers of the Pipeline
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.matched = 0
+        self.unmatched = 0
+        self.skipped = 0
+        self.over_budget = 0
+
+    def classify(self, coloredShapes, image, color_masks, profiler=profiling.DISABLED):
+        '''coloredShapes: ShapeTable classified by its Aspect Ratios, image: BGR or grayscale Frame,
+           color_masks: {LegoColor: Mask} the Shapes were found in.
+           The matching time of the Frame is recorded as 'template matching' in the profiler.'''
+        deadline = time.perf_counter() + self.budget if self.budget > 0 else None
+        rows = coloredShapes.rows
+
+        # only Shapes large enough for a Classification by their Ratio
+        candidates = np.flatnonzero(~np.isnan(rows['angle']))
+        candidates = candidates[np.argsort(np.nan_to_num(rows['confidence'][candidates]), kind='stable')]
+        matches = []
+        if len(candidates) > 0:
+            with self.lock:
+                match_time = self.match_time
+            matches, matching_time = tm.determineShapeTypesWithTemplateMatchingBatched(
+                coloredShapes, image, color_masks, self.bank, self.executor, candidates,
+                deadline, match_time, self.offset, self.min_area)
+            profiler.record('template matching', matching_time)
+
+        matched = unmatched = 0
+        durations = []
+        for i, match in zip(candidates, matches):
+            if match is None:
+                continue
+            shapeType, score, angle, duration = match
+            durations.append(duration)
+            if shapeType is None:
+                unmatched += 1
+                continue
+            matched += 1
+            rows['type'][i] = shapeType.value
+            rows['confidence'][i] = max(score, 0.0)
+            if angle is not None:
+                rows['angle'][i] = angle
+
+        with self.lock:
+            for duration in durations:
+                self.match_time = duration if self.match_time == 0 else self.match_time + 0.1 * (duration - self.match_time)
+            self.frames += 1
+            self.matched += matched
+            self.unmatched += unmatched
+            self.skipped += len(matches) - len(durations)
+            if deadline is not None and time.perf_counter() > deadline:
+                self.over_budget += 1
+
+        return coloredShapes
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def stats(self):
+        with self.lock:
+            shapes = self.matched + self.unmatched + self.skipped
+            return {
+                'frames': self.frames,
+                'matched': self.matched,
+                'unmatched': self.unmatched,
+                'skipped': self.skipped,
+                'skip_rate': self.skipped / shapes if shapes > 0 else 0.0,
+                'over_budget': self.over_budget,
+                'match_time': self.match_time
+            }
@@ -1,25 +1,42 @@
-import cv2
 import os
+import cv2
 import sys
-import numpy as np
 import time
-from datetime import datetime, timedelta
+import threading
 
-from utils import deviceManager
+from utils import frameSource
 from utils import imageConverter
 from utils import ui
 from utils import consoleWriter
+from utils.pipeline import FramePipeline
+from utils.profiler import StageProfiler
+from utils.changeGate import ChangeGate
+from utils.frameScheduler import FrameScheduler
+from utils.displayCompositor import DisplayCompositor
+from utils.multiCamera import MultiCameraRunner
+from utils.frameRecording import FrameRecorder
+from utils.detectionPublisher import DetectionPublisher
 from models.dataclasses import LegoColor
 from models.dataclasses import ShapeType
 from models.dataclasses import ColoredShape
-import models.fileConverter as fileConverter
+from models.detector import Detector, DetectionResult
+from models.templateBank import TemplateBank
+from models.templateClassifier import TemplateClassifier
+from models.shapeTracker import ShapeTracker
+from models.shapeTable import ShapeTable
 import models.algorithms as alg
+import models.colorLookup as colorLookup
 
 class Program:
-    
+
     def __init__(self, args):
-        os.system('cls')
-        
+        consoleWriter.clearConsole()
+
+        # Writing every Log Record in the Background to LOG_TARGET ('stderr' or a File)
+        log_target = args[0].get('LOG_TARGET', 'none')
+        if log_target != 'none':
+            consoleWriter.startLogWriter(log_target, float(args[0].get('LOG_FLUSH_INTERVAL', 0.5)))
+
         # Load environment Values
         self.default_refresh_rate = int(args[0]['DEF_REFRESH_RATE'])
         self.max_refresh_rate = int(args[0]['MAX_REFRESH_RATE'])
@@ -28,204 +45,538 @@ class Program:
         self.device_height = float(args[0]['CAMERA_HEIGHT'])
         self.imshow_scale = float(args[0]['IMSHOW_SCALE'])
         self.capture_number = int(args[0]['CAPTURE_NUM'])
-        
+
+        # Frame Source "camera:<number>", "video:<path>" or "images:<directory>"
+        self.frame_source = args[0].get('FRAME_SOURCE', f'camera:{self.capture_number}')
+        self.frame_source_loop = args[0].get('FRAME_SOURCE_LOOP', '0') == '1'
+        # Reading Cameras on a background Thread, which only keeps the newest Frame (no stale Driver Buffer)
+        self.latest_frame = args[0].get('LATEST_FRAME', '1') == '1'
+        # Ignoring the Refresh Rate to measure the real Throughput
+        self.as_fast_as_possible = args[0].get('AS_FAST_AS_POSSIBLE', '0') == '1'
+        # Lowering the Frame Rate while the Processing overruns the Refresh Rate
+        self.adaptive_rate = args[0].get('ADAPTIVE_RATE', '1') == '1'
+        self.scheduler = None
+        # Running without any HighGUI Window, the settings are taken from the config
+        self.headless = args[0].get('HEADLESS', '0') == '1'
+
+        # Segmentation Mode 'hsv' (cvtColor per Frame) or 'lut' (cached BGR Lookup Table)
+        self.segmentation_mode = args[0].get('SEGMENTATION_MODE', 'hsv')
+        self.lut_cache_dir = args[0].get('LUT_CACHE_DIR', 'cache')
+        self.lut_bits = int(args[0].get('LUT_BITS', 7))
+        self.color_lut = None
+        if self.segmentation_mode == 'lut':
+            self.color_lut = colorLookup.loadColorLUT(self.lut_cache_dir, alg.BACKGROUND_RANGE,
+                                                      alg.COLOR_RANGES, self.lut_bits)
+
+        # Recording the cropped Frames with their Capture Times (replayed by FRAME_SOURCE=replay:<directory>)
+        self.record_path = args[0].get('RECORD', '')
+        self.recorder = None
+
+        # Streaming the Detections of every Frame to PUBLISH_TARGET ("file:<path>", "unix:<path>" or "tcp:<host>:<port>")
+        self.publisher = None
+        publish_target = args[0].get('PUBLISH_TARGET', 'none')
+        if publish_target != 'none':
+            self.publisher = DetectionPublisher(publish_target, args[0].get('PUBLISH_FORMAT', 'jsonl'),
+                                                args[0].get('PUBLISH_BACKPRESSURE', 'drop'))
+
+        # Frame Sources of several Cameras (comma-separated), each captured and processed in its own Process
+        self.cameras = [spec.strip() for spec in args[0].get('CAMERAS', '').split(',') if spec.strip() != '']
+
+        # Number of processing Threads (0 runs capture, processing and rendering in sequence)
+        self.pipeline_workers = int(args[0].get('PIPELINE_WORKERS', 0))
+        self.pipeline_queue_size = int(args[0].get('PIPELINE_QUEUE_SIZE', 2))
+
+        # Classifier 'ratio' (Aspect Ratio of the Components) or 'template' (Template Matching
+        # within CLASSIFICATION_BUDGET Milliseconds per Frame, the Ratio for the remaining Shapes)
+        self.classifier_name = args[0].get('CLASSIFIER', 'ratio')
+        self.template_dir = args[0].get('TEMPLATE_DIR', os.path.join('assets', 'd02_templates_s'))
+        self.classification_budget = float(args[0].get('CLASSIFICATION_BUDGET', 20)) / 1000
+        # Detection on Frames resized by PROCESSING_SCALE, the Pixel Thresholds and Templates scale along,
+        # PROCESSING_REFINE measures the Shapes again at full Resolution inside their ROIs
+        self.processing_scale = float(args[0].get('PROCESSING_SCALE', 1))
+        self.processing_refine = args[0].get('PROCESSING_REFINE', '0') == '1'
+
+        self.classifier = None
+        if self.classifier_name == 'template':
+            self.classifier = TemplateClassifier(TemplateBank(self.template_dir, scale=self.processing_scale),
+                                                 self.classification_budget, int(args[0].get('CLASSIFICATION_THREADS', 0)),
+                                                 self.processing_scale)
+        elif self.classifier_name != 'ratio':
+            raise ValueError(f'Unknown classifier "{self.classifier_name}".')
+
+        self.detector = Detector(self.color_lut, classifier=self.classifier,
+                                 scale=self.processing_scale, refine=self.processing_refine)
+
+        # Stable IDs across Frames, only new or changed Shapes are classified
+        self.tracker = ShapeTracker() if args[0].get('TRACKING', '1') == '1' else None
+
+        # Reusing the last Result for static Frames, optionally reprocessing only the changed Region
+        self.change_gate = None
+        if args[0].get('CHANGE_GATE', '0') == '1':
+            self.change_gate = ChangeGate(float(args[0].get('CHANGE_GATE_THRESHOLD', 0.0005)),
+                                          partial=args[0].get('CHANGE_GATE_PARTIAL', '0') == '1',
+                                          max_skipped=int(args[0].get('CHANGE_GATE_MAX_SKIPPED', 0)))
+        # the Gate Reference and the last Result are only replaced together, by a later Frame
+        self.last_result = None
+        self.last_result_index = -1
+        self.last_result_lock = threading.Lock()
+
+        # Timing of every Stage with rolling Percentiles over the last PROFILING_WINDOW Frames
+        self.profiler = StageProfiler(args[0].get('PROFILING', '0') == '1',
+                                      int(args[0].get('PROFILING_WINDOW', 300)))
+        self.profiling_overlay = self.profiler.enabled and args[0].get('PROFILING_OVERLAY', '0') == '1'
+
+        # Console Output is only redrawn on changes, at most CONSOLE_MAX_RATE times per second
+        self.console_renderer = consoleWriter.ConsoleRenderer(float(args[0].get('CONSOLE_MAX_RATE', 10)))
+
+        # Preallocated Canvases of the Windows, the Display allocates no Buffers per Frame
+        self.compositor = DisplayCompositor()
+
+        self.headless_settings = {
+            'refresh_rate': self.default_refresh_rate,
+            'show_original': False,
+            'show_color_seperated': False,
+            'show_color_channels': False,
+            'show_result': False,
+            'show_console': False
+        }
+
         consoleWriter.writeStatus('Program initialized.')
 
     def exit(self):
         consoleWriter.writeStatus('Program exited.')
+        consoleWriter.stopLogWriter()
         exit()
 
-    def main(self):
-        
+    def createControlPanel(self):
         # Create Control Panel Window and Trackbars
         cv2.namedWindow('Control Panel')
         cv2.resizeWindow('Control Panel', 600, 300)
-        
+
         # https://www.w3schools.com/python/python_lambda.asp
-        cv2.createTrackbar('Refresh Rate','Control Panel', 
-                           int(self.default_refresh_rate / 100), 
-                           int(self.max_refresh_rate / 100), 
+        cv2.createTrackbar('Refresh Rate','Control Panel',
+                           int(self.default_refresh_rate / 100),
+                           int(self.max_refresh_rate / 100),
                            lambda placeholder: None)
-        
+
         cv2.createTrackbar('Original','Control Panel', 0, 1, lambda placeholder: None)
         cv2.createTrackbar('Colors','Control Panel', 0, 1, lambda placeholder: None)
         cv2.createTrackbar('Channels','Control Panel', 0, 1, lambda placeholder: None)
         cv2.createTrackbar('Result','Control Panel', 1, 1, lambda placeholder: None)
         cv2.createTrackbar('Console','Control Panel', 0, 1, lambda placeholder: None)
-        
+
+    def readControlPanel(self):
+        if self.headless:
+            return self.headless_settings
+
+        # Reading Trackbar Values
+        refresh_rate = cv2.getTrackbarPos('Refresh Rate','Control Panel') * 100
+        if refresh_rate == 0:
+            refresh_rate = self.min_refresh_rate
+
+        return {
+            'refresh_rate': refresh_rate,
+            'show_original': cv2.getTrackbarPos('Original','Control Panel') == 1,
+            'show_color_seperated': cv2.getTrackbarPos('Colors','Control Panel') == 1,
+            'show_color_channels': cv2.getTrackbarPos('Channels','Control Panel') == 1,
+            'show_result': cv2.getTrackbarPos('Result','Control Panel') == 1,
+            'show_console': cv2.getTrackbarPos('Console','Control Panel') == 1
+        }
+
+    def pollQuitKey(self):
+        '''Returns True when the User pressed a Key in one of the Windows.'''
+        if self.headless:
+            return False
+        return cv2.waitKey(1) >= 0
+
+    def recordFrame(self, frame, timestamp=None):
+        '''Records the cropped Frame in Capture Order, before any Processing.'''
+        if self.recorder is None:
+            return
+        self.recorder.write(imageConverter.getImageCenterSquare(frame), wall_time=timestamp)
+        self.profiler.lap('record')
+
+    def reportEndOfFrames(self, specs):
+        '''Running out of Frames is an Error for Cameras, Files, Recordings and the like simply end.'''
+        if any(frameSource.isCameraSpec(spec) for spec in specs):
+            consoleWriter.writeError('Frame not available.')
+        else:
+            consoleWriter.writeMessage('End of the frame source reached.')
+
+    def processFrame(self, frame, index=None):
+        '''index: Capture Order of the Frame, with several Workers only later Frames replace the last Result.'''
+        # Cropping the Frame to the max possible inner Square
+        frame_cropped = imageConverter.getImageCenterSquare(frame)
+        self.profiler.lap('crop')
+
+        # the Result holds the Frame at the Processing Scale, the full one is only kept for the Refinement
+        frame_processed = self.detector.scaleFrame(frame_cropped)
+        if self.processing_scale != 1:
+            self.profiler.lap('scale')
+
+        if self.change_gate is None:
+            # Seperating the colors, extracting and identifying the Shapes
+            return self.detector.detect(frame_processed, self.profiler, self.tracker, frame_cropped, index)
+
+        # with several Workers the last Result may belong to a Frame of another Worker,
+        # it is read together with the Reference it was compared against
+        with self.last_result_lock:
+            previous = self.last_result
+            decision, region = self.change_gate.check(frame_processed, None if previous is None else previous.coloredShapes)
+        self.profiler.lap('change gate')
+
+        if decision == 'skip':
+            result = DetectionResult(frame_processed, previous.foreground_mask, previous.label_map,
+                                     previous.color_masks, previous.cleaned_masks, previous.coloredShapes)
+        elif decision == 'partial':
+            result = self.detector.detectRegion(frame_processed, region, previous, self.profiler, self.tracker,
+                                                 frame_cropped, index)
+        else:
+            result = self.detector.detect(frame_processed, self.profiler, self.tracker, frame_cropped, index)
+
+        if decision != 'skip':
+            with self.last_result_lock:
+                if index is None or index > self.last_result_index:
+                    self.change_gate.renew(frame_processed)
+                    self.last_result = result
+                    self.last_result_index = -1 if index is None else index
+        return result
+
+    def processFrameProfiled(self, captured):
+        '''processFrame as a Frame of its own, for the Workers of the Pipeline.\n
+           captured: (frame, capture time, capture index) of readFrame in runPipelined.'''
+        frame, timestamp, index = captured
+        self.profiler.startFrame()
+        result = self.processFrame(frame, index)
+        result.timestamp = timestamp
+        result.frame_index = index
+        # every processed Frame is published, also when its Result is not rendered
+        self.publish(result)
+        self.profiler.record('capture latency', time.time() - timestamp)
+        self.profiler.endFrame('processing')
+        return result
+
+    def publish(self, result):
+        if self.publisher is None:
+            return
+        self.publisher.publish(result.coloredShapes, result.timestamp, frame_index=result.frame_index)
+        self.profiler.lap('publish')
+
+    def render(self, result, settings):
+        frame_cropped = result.frame
+        coloredShapes = result.coloredShapes
+
+        # Only the Console Output remains without Windows
+        if self.headless:
+            self.console_renderer.render(coloredShapes)
+            self.profiler.lap('console')
+            return
+
+        # Showing the Original Image if enabled
+        self.compositor.show(frame_cropped, 'Original', self.imshow_scale, settings['show_original'])
+        self.profiler.lap('display')
+
+        # Showing the color seperated Image if enabled
+        color_seperated = None
+        if settings['show_color_seperated']:
+            color_seperated = self.compositor.masked(frame_cropped, result.foreground_mask, 'Color seperated')
+        self.compositor.show(color_seperated, 'Color seperated', self.imshow_scale, settings['show_color_seperated'])
+        self.profiler.lap('display')
+
+        # Combine color seperated Images with a divider, the Tiles are already scaled
+        combined = None
+        if settings['show_color_channels']:
+            masks = [result.cleaned_masks.get(color) for color in (LegoColor.BLUE, LegoColor.GREEN, LegoColor.RED, LegoColor.YELLOW)]
+            combined = self.compositor.mosaic(frame_cropped, masks, 'Color Segmentation', self.imshow_scale)
+        self.profiler.lap('drawing')
+
+        # Show color seperated Image when enabled
+        self.compositor.show(combined, 'Color Segmentation', 1, settings['show_color_channels'])
+        self.profiler.lap('display')
+
+        # Write Shape-informations to the console
+        self.renderConsole(coloredShapes, settings)
+
+        frame_marked = None
+        if settings['show_result']:
+            # Drawing on a Copy, the Frame of the Result stays unmarked
+            frame_marked = self.compositor.copied(frame_cropped, 'Result')
+
+            # Draw bounding boxes around ROIs
+            frame_marked = ui.drawBBoxes(frame_marked, coloredShapes, [0,255,0], 2)
+
+            # Draw Shape Positions
+            frame_marked = ui.drawBBoxCenters(frame_marked, coloredShapes, [0,255,0], 2, 10)
+
+            # Draw Shape Information above BBoxes
+            frame_marked = ui.drawInfo(frame_marked, coloredShapes, [0,255,0], 2)
+        self.profiler.lap('drawing')
+
+        # Show Result when enabled
+        self.compositor.show(frame_marked, 'Result', self.imshow_scale, settings['show_result'])
+        self.profiler.lap('display')
+
+    def renderConsole(self, coloredShapes, settings):
+        console_size = None
+        footer_lines = None
+        if settings['show_console']:
+            console_size = (consoleWriter.CONSOLE_BODY_HEIGHT, 900)
+            if self.profiling_overlay:
+                # Room for the Stage Timings below the Shape List
+                console_size = (consoleWriter.CONSOLE_BODY_HEIGHT + 22 * 20, 900)
+                footer_lines = self.profiler.summaryLines()
+        console_image = self.console_renderer.render(coloredShapes, console_size, footer_lines)
+        self.profiler.lap('console')
+        self.compositor.show(console_image, 'Console', 1, settings['show_console'])
+        self.profiler.lap('display')
+
+    def renderCamera(self, detection, latest_shapes, settings):
+        '''Windows of the Camera of the Detection and the Console with the latest Shapes of every Camera.\n
+           Only the Original and Result Windows exist per Camera, the Masks stay in the Workers.'''
+        coloredShapes = ShapeTable.concatenate([latest_shapes[camera] for camera in sorted(latest_shapes)])
+
+        if self.headless:
+            self.console_renderer.render(coloredShapes)
+            self.profiler.lap('console')
+            return
+
+        self.renderConsole(coloredShapes, settings)
+
+        # Frames are missing when the Consumer fell behind, the Windows keep the previous one
+        frame = detection.frame
+        if frame is not None or not settings['show_original']:
+            self.compositor.show(frame, f'Original {detection.camera}', self.imshow_scale, settings['show_original'])
+        self.profiler.lap('display')
+
+        frame_marked = None
+        if settings['show_result'] and frame is not None:
+            frame_marked = self.compositor.copied(frame, f'Result {detection.camera}')
+            frame_marked = ui.drawBBoxes(frame_marked, detection.shapes, [0,255,0], 2)
+            frame_marked = ui.drawBBoxCenters(frame_marked, detection.shapes, [0,255,0], 2, 10)
+            frame_marked = ui.drawInfo(frame_marked, detection.shapes, [0,255,0], 2)
+        self.profiler.lap('drawing')
+
+        if frame is not None or not settings['show_result']:
+            self.compositor.show(frame_marked, f'Result {detection.camera}', self.imshow_scale, settings['show_result'])
+        self.profiler.lap('display')
+
+    def main(self):
+
+        if not self.headless:
+            self.createControlPanel()
+
+        capture = None
         try:
-            
-            # When no fast refresh rate is needed, the CAP_DSHOW 
+
+            # When no fast refresh rate is needed, the CAP_DSHOW
             # Windows Backend is used to locate the Video Caputre Device
             fast_mode = self.min_refresh_rate >= 100
-            
-            # getting Video Capture
-            capture = deviceManager.getVideoCapture(self.capture_number, self.device_width, self.device_height, fast_mode)
 
-            last_exec = None
-            refresh_rate = self.default_refresh_rate
-            refresh_rate_timedelta = timedelta(milliseconds=refresh_rate)
+            if len(self.cameras) > 0:
+                self.runMultiCamera(fast_mode)
+                return
+
+            # getting the Frame Source (Video Capture, Video File, Image Directory or Recording)
+            capture = frameSource.openFrameSource(self.frame_source, self.device_width, self.device_height,
+                                                  fast_mode, self.frame_source_loop, not self.as_fast_as_possible,
+                                                  self.latest_frame)
+            if self.record_path != '':
+                self.recorder = FrameRecorder(self.record_path)
+
+            if self.pipeline_workers > 0:
+                self.runPipelined(capture)
+            else:
+                self.runSequential(capture)
+
+        finally:
+            if capture is not None:
+                capture.release()
+            consoleWriter.loop_active = False
+            consoleWriter.writeStatus('Capture closed.')
+            if isinstance(capture, frameSource.LatestFrameReader):
+                stats = capture.stats()
+                consoleWriter.writeStatus(f'Frame reader: {stats["delivered"]} of {stats["captured"]} frames processed, '
+                                          f'{stats["skipped"]} skipped, frame age {stats["mean_age_ms"]:.1f} ms mean, '
+                                          f'{stats["max_age_ms"]:.1f} ms max.')
+            if self.publisher is not None:
+                # writing the queued Detections before reporting
+                self.publisher.close()
+                stats = self.publisher.stats()
+                consoleWriter.writeStatus(f'Published {stats["written"]} of {stats["published"]} frames, '
+                                          f'{stats["dropped"]} dropped, {stats["errors"]} connection errors.')
+            if self.recorder is not None:
+                self.recorder.close()
+                consoleWriter.writeStatus(f'Recorded {self.recorder.frame_count} frames to {self.record_path}.')
+            if self.scheduler is not None:
+                stats = self.scheduler.stats()
+                consoleWriter.writeStatus(f'Frame rate: {stats["achieved_fps"]:.1f} FPS achieved, {stats["requested_fps"]:.1f} requested, '
+                                          f'{stats["target_fps"]:.1f} targeted, {stats["overruns"]} of {stats["frames"]} frames overran.')
+            if self.classifier is not None:
+                self.classifier.close()
+                stats = self.classifier.stats()
+                consoleWriter.writeStatus(f'Template matching: {stats["matched"]} matched, {stats["unmatched"]} unmatched, '
+                                          f'{stats["skipped"]} classified by ratio after the budget ({stats["skip_rate"]:.0%}), '
+                                          f'{stats["over_budget"]} of {stats["frames"]} frames over budget.')
+            if self.change_gate is not None:
+                stats = self.change_gate.stats()
+                consoleWriter.writeStatus(f'Change gate: {stats["skip"]} of {stats["frames"]} frames skipped '
+                                          f'({stats["skip_rate"]:.0%}), {stats["partial"]} partial, {stats["full"]} full.')
+            if self.profiler.enabled:
+                for line in self.profiler.summaryLines():
+                    consoleWriter.writeStatus(line)
+            if not self.headless:
+                cv2.destroyAllWindows()
+
+    def runSequential(self, capture):
+        # Frame Deadlines on a monotonic Clock, the Refresh Rate includes the Processing Time
+        period = 0 if self.as_fast_as_possible else self.default_refresh_rate / 1000
+        self.scheduler = FrameScheduler(period, self.adaptive_rate, max_period=self.max_refresh_rate / 1000)
+        consoleWriter.writeStatus('Initial execution.')
+        frames_read = 0
+
+        # Running through Frames
+        while True:
+
+            # the Trackbar applies before waiting for the next Frame
+            settings = self.readControlPanel()
+            if not self.as_fast_as_possible:
+                self.scheduler.setPeriod(settings['refresh_rate'] / 1000)
+            self.scheduler.wait()
+
+            self.profiler.startFrame()
+            frameAvailable, frame, timestamp = capture.readTimestamped()
+            if not frameAvailable:
+                self.reportEndOfFrames([self.frame_source])
+                break
+            self.profiler.lap('read')
+            self.recordFrame(frame, timestamp)
+
+            result = self.processFrame(frame)
+            result.timestamp = timestamp
+            result.frame_index = frames_read
+            frames_read += 1
+            self.publish(result)
+            self.profiler.record('capture latency', time.time() - timestamp)
+            self.render(result, settings)
+
+            # Quit on User keydown
+            quit = self.pollQuitKey()
+            self.profiler.lap('waitKey')
+            self.profiler.endFrame()
+            self.scheduler.endFrame()
+            if quit:
+                break
+
+    def runPipelined(self, capture):
+        '''Captures and processes Frames on background Threads, while
+           the main Thread renders the latest Result.'''
+        frames_read = 0
 
-            # Running through Frames
+        def readFrame():
+            nonlocal frames_read
+            self.profiler.startFrame()
+            frameAvailable, frame, timestamp = capture.readTimestamped()
+            self.profiler.lap('read')
+            if frameAvailable:
+                self.recordFrame(frame, timestamp)
+            self.profiler.endFrame('capture')
+            frames_read += 1
+            return frameAvailable, (frame, timestamp, frames_read - 1)
+
+        pipeline = FramePipeline(readFrame, self.processFrameProfiled,
+                                 self.pipeline_workers, self.pipeline_queue_size)
+        pipeline.interval = 0 if self.as_fast_as_possible else self.default_refresh_rate / 1000
+
+        consoleWriter.writeStatus('Initial execution.')
+        pipeline.start()
+
+        try:
             while True:
-                
-                if last_exec is None:
-                    last_exec = datetime.now()
-                    consoleWriter.writeStatus('Initial execution.')
-                    
-                exec_diff = datetime.now() - last_exec
-                
-                if exec_diff < refresh_rate_timedelta:
-                    time_to_sleep = refresh_rate_timedelta - exec_diff
-                    time.sleep(time_to_sleep.total_seconds())
+                result = pipeline.getResult(timeout=0.1)
+
+                if pipeline.error is not None:
+                    raise pipeline.error
+
+                if result is None:
+                    if pipeline.finished():
+                        self.reportEndOfFrames([self.frame_source])
+                        break
+                    # keeping the Windows responsive while waiting
+                    if self.pollQuitKey():
+                        break
                     continue
-                else:
-                    last_exec = datetime.now()
-                
-                frameAvailable, frame = capture.read()
-                if not frameAvailable:
-                    consoleWriter.writeError('Frame not available.')
+
+                self.profiler.startFrame()
+                settings = self.readControlPanel()
+                if not self.as_fast_as_possible:
+                    pipeline.interval = settings['refresh_rate'] / 1000
+                self.profiler.lap('control panel')
+
+                self.render(result, settings)
+
+                # Quit on User keydown
+                quit = self.pollQuitKey()
+                self.profiler.lap('waitKey')
+                self.profiler.endFrame()
+                if quit:
                     break
-                
-                # Reading Trackbar Values
-                refresh_rate = cv2.getTrackbarPos('Refresh Rate','Control Panel') * 100
-                refresh_rate_timedelta = timedelta(milliseconds=refresh_rate)
-                show_original = cv2.getTrackbarPos('Original','Control Panel') == 1
-                show_color_seperated = cv2.getTrackbarPos('Colors','Control Panel') == 1
-                show_color_channels = cv2.getTrackbarPos('Channels','Control Panel') == 1
-                show_result = cv2.getTrackbarPos('Result','Control Panel') == 1
-                show_console = cv2.getTrackbarPos('Console','Control Panel') == 1
-
-                if refresh_rate == 0:
-                    refresh_rate = self.min_refresh_rate
-                    refresh_rate_timedelta = timedelta(milliseconds=refresh_rate)
-
-                # Cropping the Frame to the max possible inner Square
-                frame_cropped = imageConverter.getImageCenterSquare(frame)
-                
-                # Showing the Original Image if enabled
-                ui.showImage(frame_cropped, 'Original', self.imshow_scale, show_original)
-
-                # Seperating the colors from the Background using Color Segmentation
-                # and opening and closing
-                color_seperated_mask, color_seperated = alg.colorSegmentation(
-                    frame_cropped, 5,
-                    np.array([0, 75, 0]), 
-                    np.array([255, 255, 255])
-                )
-                
-                # Showing the color seperated Image if enabled
-                ui.showImage(color_seperated, 'Color seperated', self.imshow_scale, show_color_seperated)
-
-                # Using color specific Segmentation
-                # Filtering out blue Pixels
-                blue_mask, blue_seperated = alg.colorSegmentation(
-                    color_seperated, 3,
-                    np.array([100, 100, 0]), 
-                    np.array([170, 255, 255])
-                )
-                # Filtering out green Pixels
-                green_mask, green_seperated = alg.colorSegmentation(
-                    color_seperated, 3,
-                    np.array([50, 27, 0]), 
-                    np.array([100, 255, 131])
-                )
-                
-                # Filtering out red Pixels
-                red_seperated_mask_upper, red_seperated_upper = alg.colorSegmentation(
-                    color_seperated, 1,
-                    np.array([140, 0, 0]), 
-                    np.array([255, 255, 255])
-                )
-
-                red_seperated_mask_lower, red_seperated_lower = alg.colorSegmentation(
-                    color_seperated, 1,
-                    np.array([0, 0, 0]), 
-                    np.array([10, 255, 255])
-                )
-                red_seperated = cv2.add(red_seperated_upper, 
-                                        red_seperated_lower)
-                
-                # https://medium.com/featurepreneur/performing-bitwise-operations-on-images-using-opencv-6fd5c3cd72a7
-                # Adding the black pixels from the mask_lower to the color_mask, to
-                # remove the other colored areas.
-                red_mask = cv2.bitwise_and(color_seperated_mask, red_seperated_mask_lower)
-                # Adding the white pixels from the upper mask to get the full 
-                # color spectrum of red.
-                red_mask = cv2.bitwise_or(red_mask, red_seperated_mask_upper)
-                
-                # Opening and Closing again on the seperated image to get rid of the flickering
-                _, red_seperated = alg.colorSegmentation(
-                    red_seperated, 5,
-                    np.array([0, 0, 0]), 
-                    np.array([255, 255, 255])
-                )
-                
-                # Filtering out yellow Pixels
-                yellow_mask, yellow_seperated = alg.colorSegmentation(
-                    color_seperated, 3,
-                    np.array([11, 50, 0]), 
-                    np.array([30, 255, 255])
-                )
-
-                # Save color-specific masks for later shape detection
-                color_masks = { 
-                    LegoColor.BLUE: blue_mask, 
-                    LegoColor.GREEN: green_mask, 
-                    LegoColor.RED: red_mask, 
-                    LegoColor.YELLOW: yellow_mask
-                }
-
-                # Combine color seperated Images with a divider
-                combined = ui.combineImages(np.array([blue_seperated, green_seperated]), 
-                                            np.array([red_seperated, yellow_seperated]), 3) 
-                
-                # Show color seperated Image when enabled
-                ui.showImage(combined, 'Color Segmentation', self.imshow_scale, show_color_channels)
-                    
-                # extracting color-specifc ROIs
-                roi_dict = alg.get_color_rois(blue_seperated,
-                                              green_seperated,
-                                              red_seperated,
-                                              yellow_seperated)
-
-                # Converting ROIs into dataclass ColoredShape
-                coloredShapes = fileConverter.convertRoiDictIntoColoredShapeList(roi_dict)
-
-                # Filtering out all Shapes with a total pixel Count of 750
-                coloredShapes = alg.filterShapesByPixelCount(coloredShapes, 750)
-
-                # determining the Shapes positions in the unit square
-                coloredShapes = alg.determineShapePositions(coloredShapes, frame_cropped)
-
-                # identifying the Shape Types
-                coloredShapes = alg.determineShapeTypes(coloredShapes, color_masks)
-
-                # Write Shape-informations to the console
-                console_height, console_width = 400, 900
-                console_image = np.zeros((console_height, console_width, 3), dtype=np.uint8)
-                console_image = consoleWriter.writeShapeListToConsole(coloredShapes, show_console, console_image)
-                ui.showImage(console_image, 'Console', 1, show_console)
-
-                # Draw bounding boxes around ROIs
-                frame_marked = ui.drawBBoxes(frame_cropped, coloredShapes, [0,255,0], 2)
-
-                # Draw Shape Positions
-                frame_marked = ui.drawBBoxCenters(frame_marked, coloredShapes, [0,255,0], 2, 10)
-
-                # Draw Shape Information above BBoxes
-                frame_marked = ui.drawInfo(frame_marked, coloredShapes, [0,255,0], 2) 
-                    
-                # Show Result when enabled
-                ui.showImage(frame_marked, 'Result', self.imshow_scale, show_result)
-                    
+        finally:
+            pipeline.stop()
+            stats = pipeline.stats()
+            consoleWriter.loop_active = False
+            consoleWriter.writeStatus(f'Pipeline: {stats["captured"]} captured, {stats["processed"]} processed, '
+                                      f'{stats["dropped_frames"]} frames and {stats["dropped_results"]} results dropped, '
+                                      f'{stats["stale_results"]} stale, max. queue depth '
+                                      f'{stats["frame_queue_max_depth"]} / {stats["result_queue_max_depth"]}.')
+
+    def runMultiCamera(self, fast_mode):
+        '''Captures and processes every Camera in its own Process (see MultiCameraRunner),
+           while the main Thread renders the merged Detections.'''
+        period = 0 if self.as_fast_as_possible else self.default_refresh_rate / 1000
+        runner = MultiCameraRunner(self.cameras, self.device_width, self.device_height, fast_mode,
+                                   self.frame_source_loop, self.segmentation_mode, self.lut_cache_dir,
+                                   self.lut_bits, self.tracker is not None, period, self.record_path,
+                                   self.classifier_name, self.template_dir, self.classification_budget,
+                                   self.processing_scale, self.processing_refine, self.latest_frame)
+        latest_shapes = {}
+
+        consoleWriter.writeStatus('Initial execution.')
+        runner.start()
+
+        try:
+            while True:
+                detection = runner.getDetection(timeout=0.1)
+
+                if detection is None:
+                    if runner.finished():
+                        self.reportEndOfFrames(self.cameras)
+                        break
+                    # keeping the Windows responsive while waiting
+                    if self.pollQuitKey():
+                        break
+                    continue
+
+                self.profiler.startFrame()
+                settings = self.readControlPanel()
+                self.profiler.lap('control panel')
+
+                if self.publisher is not None:
+                    self.publisher.publish(detection.shapes, detection.timestamp, detection.camera, detection.index)
+                    self.profiler.lap('publish')
+                self.profiler.record('capture latency', time.time() - detection.timestamp)
+
+                latest_shapes[detection.camera] = detection.shapes
+                self.renderCamera(detection, latest_shapes, settings)
+
                 # Quit on User keydown
-                key = cv2.waitKey(1)
-                if key >= 0:
+                quit = self.pollQuitKey()
+                self.profiler.lap('waitKey')
+                self.profiler.endFrame()
+                if quit:
                     break
-                
         finally:
-            capture.release()
+            runner.stop()
             consoleWriter.loop_active = False
-            consoleWriter.writeStatus('Capture closed.')
-            cv2.destroyAllWindows()
\ No newline at end of file
+            for stats in runner.stats():
+                consoleWriter.writeStatus(f'Camera {stats["camera"]} ({stats["source"]}): {stats["detections"]} detections, '
+                                          f'{stats["fps"]:.1f} FPS, {stats["frames_without_slot"]} without frame.')
@@ -0,0 +1,67 @@
+from enum import Enum
+
+import cv2
+import numpy as np
+import pytest
+
+import models.algorithms as alg
+from models.dataclasses import ColorRange
+
+
+# Labels beyond the LegoColors
+class Label(Enum):
+    ONE = 1
+    TWO = 2
+    SEVEN = 7
+    EIGHT = 8
+
+
+@pytest.mark.parametrize('kernalSizes', [(3, 3, 3, 3), (1, 3, 3, 5)])
+def test_cleanColorMasks_matches_cleanMask(kernalSizes):
+    rng = np.random.default_rng(0)
+    # Blobs of every Label on Background with Noise, so Opening and Closing both change the Masks
+    label_map = np.zeros((120, 160), np.uint8)
+    for label in Label:
+        for _ in range(6):
+            x, y = rng.integers(0, 140), rng.integers(0, 100)
+            w, h = rng.integers(3, 20, size=2)
+            label_map[y:y+h, x:x+w] = label.value
+    noise = rng.random(label_map.shape) < 0.05
+    label_map[noise] = rng.choice([label.value for label in Label] + [0], size=int(noise.sum()))
+
+    color_ranges = [ColorRange(label, [0, 0, 0], [0, 0, 0], kernalSize)
+                    for label, kernalSize in zip(Label, kernalSizes)]
+    cleaned_masks = alg.cleanColorMasks(label_map, color_ranges)
+
+    for color_range in color_ranges:
+        expected = alg.cleanMask(alg.getColorMask(label_map, color_range.color), color_range.kernalSize)
+        assert np.count_nonzero(expected) > 0
+        np.testing.assert_array_equal(cleaned_masks[color_range.color], expected)
+
+
+def drawRectangle(size, angle, shape=(200, 200)):
+    mask = np.zeros(shape, np.uint8)
+    box = cv2.boxPoints(((shape[1] / 2, shape[0] / 2), size, angle))
+    cv2.fillPoly(mask, [np.round(box).astype(np.int32)], 255)
+    return mask
+
+
+@pytest.mark.parametrize('angle', [20, 30, 60])
+def test_labelColorMask_angle_of_rotated_square(angle):
+    mask = drawRectangle((60, 60), angle)
+    _, _, sizes, angles = alg.labelColorMask(mask, 1000)
+
+    _, _, expected = alg.getMinBBox(mask, 1000)
+    assert len(angles) == 1
+    assert angles[0] == pytest.approx(expected)
+    assert angles[0] == pytest.approx(angle, abs=1)
+    assert sizes[0, 0] == pytest.approx(sizes[0, 1], rel=0.01)
+
+
+@pytest.mark.parametrize('size, expected', [((30, 120), 0.0), ((120, 30), 90.0)])
+def test_labelColorMask_angle_of_upright_rectangle(size, expected):
+    mask = drawRectangle(size, 0)
+    _, _, sizes, angles = alg.labelColorMask(mask, 1000)
+
+    assert angles[0] == expected
+    assert sizes[0, 1] / sizes[0, 0] == pytest.approx(4, rel=0.05)
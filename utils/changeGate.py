@@ -0,0 +1,117 @@
+import threading
+
+import cv2
+import numpy as np
+
+from utils import imageConverter
+
+class ChangeGate:
+    '''Decides per cropped Frame whether the Detection has to run again.\n
+       The Frame is compared on a downscaled gray Copy with the last processed Frame:
+       'skip' (reuse the previous Detections), 'partial' (only the changed Region)
+       or 'full'. Skipped Frames do not renew the Reference, so slow Changes add up.
+       The Reference is renewed by the Caller (see renew) together with the Result it belongs to.'''
+
+    def __init__(self, threshold=0.0005, pixel_threshold=15, size=96, partial=False,
+                 max_partial_area=0.4, margin=16, max_skipped=0):
+        # Fraction of changed Pixels (downscaled) below which a Frame counts as static
+        self.threshold = threshold
+        # Gray Value Difference of a changed Pixel
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.partial = partial
+        # Largest Region (fraction of the Frame) still processed partially
+        self.max_partial_area = max_partial_area
+        # Margin around the changed Region in full resolution Pixels
+        self.margin = margin
+        # Forces a full Run after this many skipped Frames in a row (0 = never)
+        self.max_skipped = max_skipped
+
+        self.reference = None
+        self.skipped_in_row = 0
+        self.lock = threading.Lock()
+        self.counts = {'skip': 0, 'partial': 0, 'full': 0}
+
+    def downscale(self, frame_cropped):
+        small = cv2.resize(frame_cropped, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return imageConverter.convertToGray(small)
+
+    def check(self, frame_cropped, previous_shapes=None):
+        '''Returns the Decision and for 'partial' the Region (x, y, w, h) to process.\n
+           previous_shapes: Shapes of the last Result, Regions are grown to contain every touched Shape.'''
+        small = self.downscale(frame_cropped)
+
+        with self.lock:
+            decision, region = self._decide(small, frame_cropped.shape[:2], previous_shapes)
+            self.counts[decision] += 1
+            if decision == 'skip':
+                self.skipped_in_row += 1
+            else:
+                self.skipped_in_row = 0
+
+        return decision, region
+
+    def renew(self, frame_cropped):
+        '''Makes the Frame the Reference, once its Result replaced the previous one.'''
+        small = self.downscale(frame_cropped)
+        with self.lock:
+            self.reference = small
+
+    def _decide(self, small, frame_shape, previous_shapes):
+        if self.reference is None or previous_shapes is None:
+            return 'full', None
+
+        changed = cv2.compare(cv2.absdiff(small, self.reference), self.pixel_threshold, cv2.CMP_GT)
+        changed_count = cv2.countNonZero(changed)
+        if changed_count <= self.threshold * changed.size:
+            if self.max_skipped > 0 and self.skipped_in_row >= self.max_skipped:
+                return 'full', None
+            return 'skip', None
+
+        if not self.partial:
+            return 'full', None
+
+        region = self.getChangedRegion(changed, frame_shape, previous_shapes)
+        h, w = frame_shape
+        if region is None or region[2] * region[3] > self.max_partial_area * w * h:
+            return 'full', None
+        return 'partial', region
+
+    def getChangedRegion(self, changed, frame_shape, previous_shapes):
+        '''BBox of all changed Pixels in full resolution, grown by the margin and the touched Shapes.'''
+        points = cv2.findNonZero(changed)
+        if points is None:
+            return None
+        h, w = frame_shape
+        scale_x, scale_y = w / changed.shape[1], h / changed.shape[0]
+        x, y, rw, rh = cv2.boundingRect(points)
+        x0 = max(0, int(x * scale_x) - self.margin)
+        y0 = max(0, int(y * scale_y) - self.margin)
+        x1 = min(w, int(np.ceil((x + rw) * scale_x)) + self.margin)
+        y1 = min(h, int(np.ceil((y + rh) * scale_y)) + self.margin)
+
+        # Shapes cut by the Region are processed as a whole, until no further Shape is touched
+        rois = previous_shapes.rows['roi'] if hasattr(previous_shapes, 'rows') \
+            else np.array([shape.roi for shape in previous_shapes], dtype=np.int32).reshape(-1, 4)
+        for _ in range(len(rois)):
+            touched = (rois[:, 0] < x1) & (rois[:, 0] + rois[:, 2] > x0) & \
+                      (rois[:, 1] < y1) & (rois[:, 1] + rois[:, 3] > y0)
+            if not touched.any():
+                break
+            grown = (max(0, min(x0, int(rois[touched, 0].min()) - self.margin)),
+                     max(0, min(y0, int(rois[touched, 1].min()) - self.margin)),
+                     min(w, max(x1, int((rois[touched, 0] + rois[touched, 2]).max()) + self.margin)),
+                     min(h, max(y1, int((rois[touched, 1] + rois[touched, 3]).max()) + self.margin)))
+            if grown == (x0, y0, x1, y1):
+                break
+            x0, y0, x1, y1 = grown
+
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        frames = sum(counts.values())
+        counts['frames'] = frames
+        counts['skip_rate'] = counts['skip'] / frames if frames > 0 else 0.0
+        return counts
@@ -1,101 +1,386 @@
 from datetime import datetime
 import os
+import sys
+import time
+import atexit
+import threading
+from collections import deque
 import cv2
 import numpy as np
 
-messages = {'messages':[], 'status':[], 'warnings':[], 'errors':[]}
+# Ring Buffer Capacity per Level, the Console shows the buffered Records
+LOG_CAPACITY = {'messages': 10, 'status': 10, 'warnings': 10, 'errors': 10}
+LOG_PREFIXES = {'warnings': '⚠️ ', 'errors': '❌ '}
+LOG_LEVEL_NAMES = {'messages': 'INFO', 'status': 'STATUS', 'warnings': 'WARNING', 'errors': 'ERROR'}
+# Identical Records within this Interval (seconds) are only counted
+REPEAT_INTERVAL = 5.0
+MAX_TRACKED_REPEATS = 1000
+
+messages = {level: deque(maxlen=capacity) for level, capacity in LOG_CAPACITY.items()}
 loop_active = False
 
-def writeShapeListToConsole(shape_list, generateConsoleImage, console_image):
-    global loop_active
-    loop_active = True
-    
-    os.system("cls")
-    consoleString = '\n-------------------------------------------------------------------\n'
-    time = datetime.now().time()
-    time_str = f'| {time.hour}:{time.minute}:{time.second} |'
-    
-    shape_count = len(shape_list)
-    if shape_count > 0:
-        consoleString += f'{time_str} Detected {len(shape_list)} Object(s) \n'
-        consoleString += '-------------------------------------------------------------------\n'
-    else:
-       consoleString += f'{time_str}  There were no Objects found \n'
+# Background LogWriter, None while no Log Target is configured
+log_writer = None
+_repeats = {}
+_repeats_lock = threading.Lock()
 
-    placeholder = '|'
-    for i in range(len(time_str)-2):
-        placeholder += ' '
-    placeholder += '|'
+SEPARATOR = '-------------------------------------------------------------------'
+# Index of the Line holding the Time and the Object Count
+HEADER_LINE = 2
+TIME_WIDTH = len('| 00:00:00 |')
 
-    consoleString += placeholder + '          |             |                |       \n'
+# Console Image Layout
+CONSOLE_BODY_HEIGHT = 400
+CONSOLE_LINE_HEIGHT = 22
 
-    left_column = placeholder
+# ANSI Escape Codes
+CLEAR_SCREEN = '\x1b[H\x1b[2J'
+CLEAR_LINE_END = '\x1b[K'
+CLEAR_SCREEN_END = '\x1b[J'
 
-    for i in range(len(shape_list)):
+# enableAnsi Result per Stream, the Check runs once
+ansi_streams = {}
 
-        left_column_list = list(left_column)
-        indexToReplace = len(left_column) // 2 - 1
-        if i - 9 >= 0:
-            left_column_list[indexToReplace+1] = ''
-            left_column_list[indexToReplace] = f'{i+1}'
-        else:
-            left_column_list[indexToReplace] = f'0'
-            left_column_list[indexToReplace+1] = f'{i+1}'
+def enableAnsi(stream):
+    '''True when the Stream is a Terminal understanding ANSI Escape Codes.'''
+    if stream in ansi_streams:
+        return ansi_streams[stream]
+    ansi = hasattr(stream, 'isatty') and stream.isatty()
+    if ansi and os.name == 'nt':
+        # an empty Command enables the Virtual Terminal Processing of the Windows Console
+        os.system('')
+    ansi_streams[stream] = ansi
+    return ansi
 
-        left_column = "".join(left_column_list)
+def clearConsole(stream=sys.stdout):
+    if enableAnsi(stream):
+        stream.write(CLEAR_SCREEN)
+        stream.flush()
 
-        consoleString += f'{left_column} {shape_list[i]} \n'
+def getTimeString():
+    now = datetime.now().time()
+    return f'| {now.hour:02}:{now.minute:02}:{now.second:02} |'
 
-    consoleString += placeholder + '          |             |                |       \n'
+def formatConsoleLines(shape_list):
+    '''Lines of the Shape Table and the Messages.\n
+       The Header Line (HEADER_LINE) still lacks the Time, see stampConsoleLines.'''
+    lines = ['', SEPARATOR]
+
+    shape_count = len(shape_list)
+    if shape_count > 0:
+        lines.append(f' Detected {shape_count} Object(s) ')
+        lines.append(SEPARATOR)
+    else:
+        lines.append(f'  There were no Objects found ')
+
+    placeholder = '|' + ' ' * (TIME_WIDTH - 2) + '|'
+    spacer = placeholder + '          |             |                |       '
+    index_column = len(placeholder) // 2 - 1
+
+    lines.append(spacer)
+    for i, shape in enumerate(shape_list):
+        # the stable Track ID when tracked (see ui.drawInfo), prefixed by the Camera in merged Streams
+        label = f'{getattr(shape, "trackId", None) or i+1:02}'
+        camera = getattr(shape, 'camera', None)
+        if camera is not None:
+            label = f'{camera}:{label}'
+        start = index_column - (len(label) - 2) // 2
+        lines.append(f'{placeholder[:start]}{label}{placeholder[start+len(label):]} {shape} ')
+    lines.append(spacer)
+    lines.append(SEPARATOR)
 
-    consoleString += '-------------------------------------------------------------------\n'
-    
     for messageType in messages:
         if messageType == 'status':
             continue
         for message in messages[messageType]:
-            consoleString += f'| {message}\n'
-    
-    consoleString += '-------------------------------------------------------------------\n\n'
+            lines.append(f'| {message}')
+
+    lines.append(SEPARATOR)
+    lines.append('')
+    return lines
+
+def stampConsoleLines(lines):
+    stamped = list(lines)
+    stamped[HEADER_LINE] = getTimeString() + stamped[HEADER_LINE]
+    return stamped
 
-    print(consoleString)
+def drawConsoleLines(console_image, lines):
+    lines = '\n'.join(lines).replace('|','').replace(chr(176),' degrees').split('\n')
+
+    y_offset = CONSOLE_LINE_HEIGHT
+    for line in lines:
+        cv2.putText(console_image, line, (10, y_offset), cv2.FONT_ITALIC, 0.5, [0,255,0], 2)
+        y_offset += CONSOLE_LINE_HEIGHT
+
+    return console_image
+
+def writeShapeListToConsole(shape_list, generateConsoleImage, console_image):
+    '''Clears the Terminal and prints the Shape List, see ConsoleRenderer for the incremental Output.'''
+    global loop_active
+    loop_active = True
+
+    lines = stampConsoleLines(formatConsoleLines(shape_list))
+    clearConsole()
+    print('\n'.join(lines))
 
     if generateConsoleImage:
         if console_image is None:
             writeWarning('console_image in consoleWriter was None.')
-        line_height = 22
+            return None
+        return drawConsoleLines(console_image, lines)
+
 
-        lines = consoleString.replace('|','').replace(chr(176),' degrees').split('\n')
+class ConsoleRenderer:
+    '''Incremental Output of the Shape List to the Terminal and a persistent Console Image.\n
+       Redraws only when the Lines changed and at most max_rate times per second (0 = no limit).
+       In a Terminal only the changed Lines are rewritten with ANSI Cursor Control,
+       other Streams (e.g. Log Files) get the whole Table per change.'''
+
+    def __init__(self, max_rate=10, stream=None):
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.stream = sys.stdout if stream is None else stream
+        self.ansi = enableAnsi(self.stream)
+
+        self.last_render = None
+        self.lines = None
+        self.terminal_lines = None
+        self.canvas = None
+        self.canvas_lines = None
+        self.footer_lines = None
+
+        self.redraws = 0
+        self.skipped = 0
+
+    def render(self, shape_list, image_size=None, footer_lines=None, write_terminal=True):
+        '''image_size: (height, width) of the Console Image or None for no Image.\n
+           footer_lines: Lines below the Shape List in the Image (e.g. Stage Timings).
+           Returns the Console Image or None.'''
+        global loop_active
+        loop_active = True
+
+        now = time.perf_counter()
+        canvas_ready = image_size is None or (self.canvas is not None and self.canvas.shape[:2] == tuple(image_size))
+        if self.last_render is not None and now - self.last_render < self.min_interval and canvas_ready:
+            self.skipped += 1
+            return self.canvas if image_size is not None else None
+        self.last_render = now
+
+        lines = formatConsoleLines(shape_list)
+        changed = lines != self.lines
+        if changed:
+            self.lines = lines
+            self.redraws += 1
+            stamped = stampConsoleLines(lines)
+            if write_terminal:
+                self.writeTerminal(stamped)
+        else:
+            self.skipped += 1
 
-        y_offset = line_height
-        for line in lines:
-            cv2.putText(console_image, line, (10, y_offset), cv2.FONT_ITALIC, 0.5, [0,255,0], 2)
-            y_offset += line_height
+        if image_size is None:
+            return None
 
-        return console_image
-    
+        if self.canvas is None or self.canvas.shape[:2] != tuple(image_size):
+            self.canvas = np.zeros((image_size[0], image_size[1], 3), dtype=np.uint8)
+            self.canvas_lines = None
+            self.footer_lines = None
+
+        if self.canvas_lines != lines:
+            body = self.canvas[:CONSOLE_BODY_HEIGHT]
+            body[:] = 0
+            drawConsoleLines(body, stampConsoleLines(lines))
+            self.canvas_lines = lines
+
+        if footer_lines is not None and footer_lines != self.footer_lines:
+            footer = self.canvas[CONSOLE_BODY_HEIGHT:]
+            footer[:] = 0
+            y = CONSOLE_LINE_HEIGHT
+            for line in footer_lines:
+                cv2.putText(footer, line, (10, y), cv2.FONT_HERSHEY_PLAIN, 1.1, [0,200,255], 1)
+                y += CONSOLE_LINE_HEIGHT
+            self.footer_lines = footer_lines
+
+        return self.canvas
+
+    def writeTerminal(self, lines):
+        if not self.ansi:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+            return
+
+        output = []
+        previous = self.terminal_lines
+        if previous is None:
+            output.append(CLEAR_SCREEN)
+            previous = []
+
+        # rewriting only the changed Lines (Cursor Positions are 1-based)
+        for i, line in enumerate(lines):
+            if i < len(previous) and previous[i] == line:
+                continue
+            output.append(f'\x1b[{i+1};1H{line}{CLEAR_LINE_END}')
+        if len(lines) < len(previous):
+            output.append(f'\x1b[{len(lines)+1};1H{CLEAR_SCREEN_END}')
+        output.append(f'\x1b[{len(lines)+1};1H')
+
+        self.stream.write(''.join(output))
+        self.stream.flush()
+        self.terminal_lines = lines
+
+
+class LogRecord:
+    __slots__ = ('timestamp', 'level', 'text', 'repeated')
+
+    def __init__(self, timestamp, level, text, repeated=0):
+        self.timestamp = timestamp
+        self.level = level
+        self.text = text
+        # Number of identical Records suppressed before this one
+        self.repeated = repeated
+
+    def __str__(self):
+        if self.repeated > 0:
+            return f'{LOG_PREFIXES.get(self.level, "")}{self.text} (repeated {self.repeated}x)'
+        return f'{LOG_PREFIXES.get(self.level, "")}{self.text}'
+
+    def format(self):
+        timestamp = datetime.fromtimestamp(self.timestamp).isoformat(timespec='milliseconds')
+        return f'{timestamp} {LOG_LEVEL_NAMES[self.level]:<7} {self.text}' + \
+               (f' (repeated {self.repeated}x)' if self.repeated > 0 else '')
+
+
+class LogWriter:
+    '''Background Thread writing the Log Records in Batches to a File or stderr.\n
+       Callers only append to a bounded Queue, the oldest Records are dropped when the Writer falls behind.'''
+
+    def __init__(self, target='stderr', flush_interval=0.5, max_pending=10000):
+        self.target = target
+        self.stream = sys.stderr if target == 'stderr' else open(target, 'a', encoding='utf-8')
+        self.flush_interval = flush_interval
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.written = 0
+        self.wakeup = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self.thread.start()
+
+    def enqueue(self, record):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(record)
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            # Repeats of Records, which did not come back within REPEAT_INTERVAL
+            flushRepeats()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.pending.popleft())
+            except IndexError:
+                break
+        if batch:
+            self.stream.write(''.join(record.format() + '\n' for record in batch))
+            self.stream.flush()
+            self.written += len(batch)
+
+    def close(self):
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+        if self.target != 'stderr':
+            self.stream.close()
+
+
+def startLogWriter(target, flush_interval=0.5):
+    '''target: 'stderr' or the Path of a Log File (appended).'''
+    global log_writer
+    stopLogWriter()
+    log_writer = LogWriter(target, flush_interval)
+    atexit.register(stopLogWriter)
+
+def stopLogWriter():
+    global log_writer
+    if log_writer is not None:
+        flushRepeats(0)
+        log_writer.close()
+        log_writer = None
+
+def _popRepeats(keys, now):
+    '''Stops tracking the Records and returns Records of their suppressed Repeats (under _repeats_lock).'''
+    records = []
+    for key in keys:
+        _, repeated = _repeats.pop(key)
+        if repeated > 0:
+            records.append(LogRecord(now, key[0], key[1], repeated))
+    return records
+
+def _emit(record):
+    messages[record.level].append(record)
+    if log_writer is not None:
+        log_writer.enqueue(record)
+
+def flushRepeats(max_age=None):
+    '''Logs the suppressed Repeats of all Records logged at least max_age seconds ago (REPEAT_INTERVAL by default).'''
+    max_age = REPEAT_INTERVAL if max_age is None else max_age
+    now = time.time()
+    with _repeats_lock:
+        records = _popRepeats([key for key, repeat in _repeats.items() if now - repeat[0] >= max_age], now)
+    for record in records:
+        _emit(record)
+
+def log(level, text):
+    '''Stores the Record in the Ring Buffer of its Level and queues it for the LogWriter.\n
+       Returns the Record or None, when an identical Record was logged within REPEAT_INTERVAL.'''
+    now = time.time()
+    key = (level, text)
+    evicted = []
+    with _repeats_lock:
+        repeat = _repeats.pop(key, None)
+        if repeat is not None and now - repeat[0] < REPEAT_INTERVAL:
+            repeat[1] += 1
+            _repeats[key] = repeat
+            return None
+        if len(_repeats) >= MAX_TRACKED_REPEATS:
+            # the oldest Records make room, their Repeats are logged
+            oldest = list(_repeats)[:len(_repeats) - MAX_TRACKED_REPEATS + 1]
+            evicted = _popRepeats(oldest, now)
+        _repeats[key] = [now, 0]
+
+    for record in evicted:
+        _emit(record)
+    record = LogRecord(now, level, text, 0 if repeat is None else repeat[1])
+    _emit(record)
+    return record
 
 def writeMessage(message):
-    messages['messages'].append(message)
-    if not loop_active:
-        print(message)
-    
+    record = log('messages', message)
+    if record is not None and not loop_active:
+        print(record)
+
 def writeWarning(message):
-    messages['warnings'].append(f'⚠️ {message}')
-    if not loop_active:
-        print(f'⚠️ {message}')
-    
-def writeError(message, error):
+    record = log('warnings', message)
+    if record is not None and not loop_active:
+        print(record)
+
+def writeError(message, error=None):
+    # Messages may already end with a Punctuation Mark
+    if not message.endswith(('.', '!', '?')):
+        message += '.'
     if error:
-        messages['errors'].append(f'❌ {message}. Error Message: ', error)
-        if not loop_active:
-            print(f'❌ {message}. Error Message: ', error)
+        record = log('errors', f'{message} Error Message: {error}')
     else:
-        messages['errors'].append(f'❌ {message}.')
-        if not loop_active:
-            print(f'❌ {message}.')
-            
+        record = log('errors', message)
+    if record is not None and not loop_active:
+        print(record)
+
 def writeStatus(message):
-    messages['status'].append(message)
-    if not loop_active:
-        print(message)
\ No newline at end of file
+    record = log('status', message)
+    if record is not None and not loop_active:
+        print(record)
\ No newline at end of file
@@ -0,0 +1,236 @@
+import json
+import time
+import socket
+import struct
+import threading
+from collections import deque
+
+import numpy as np
+
+from models.dataclasses import LegoColor, ShapeType
+from models.shapeTable import ShapeTable
+
+# Binary Record per Frame: Header followed by shape_count Shape Records (little endian)
+BINARY_MAGIC = b'LD'
+BINARY_VERSION = 2
+# magic, version, camera (-1 = none), frame index, timestamp (time.time()), shape count
+FRAME_HEADER = struct.Struct('<2sBbIdH')
+# color / type: LegoColor / ShapeType value (0 = unknown), x / y / angle / confidence: NaN when unknown
+SHAPE_RECORD_DTYPE = np.dtype([
+    ('id', '<i4'),
+    ('color', 'u1'),
+    ('type', 'u1'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('angle', '<f4'),
+    ('confidence', '<f4')
+])
+
+_COLOR_NAMES = {color.value: str(color) for color in LegoColor}
+_SHAPE_TYPE_NAMES = {shapeType.value: str(shapeType) for shapeType in ShapeType}
+
+def encodeJsonLine(frame_index, timestamp, camera, rows):
+    shapes = []
+    columns = (rows['id'].tolist(), rows['color'].tolist(), rows['type'].tolist(), rows['pos'][:, 0].tolist(),
+               rows['pos'][:, 1].tolist(), rows['angle'].tolist(), rows['confidence'].tolist())
+    for trackId, color, shapeType, x, y, angle, confidence in zip(*columns):
+        shapes.append({
+            'id': None if trackId < 0 else trackId,
+            'color': _COLOR_NAMES.get(color),
+            'type': _SHAPE_TYPE_NAMES.get(shapeType),
+            'x': None if x != x else round(x, 4),
+            'y': None if y != y else round(y, 4),
+            'angle': None if angle != angle else round(angle, 2),
+            'confidence': None if confidence != confidence else round(confidence, 3)
+        })
+    record = {'frame': frame_index, 'timestamp': timestamp, 'camera': camera, 'shapes': shapes}
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+def encodeBinaryRecord(frame_index, timestamp, camera, rows):
+    shapes = np.empty(len(rows), dtype=SHAPE_RECORD_DTYPE)
+    shapes['id'] = rows['id']
+    shapes['color'] = rows['color']
+    shapes['type'] = rows['type']
+    shapes['x'] = rows['pos'][:, 0]
+    shapes['y'] = rows['pos'][:, 1]
+    shapes['angle'] = rows['angle']
+    shapes['confidence'] = rows['confidence']
+    header = FRAME_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, -1 if camera is None else camera,
+                               frame_index, timestamp, len(rows))
+    return header + shapes.tobytes()
+
+def decodeBinaryRecords(data):
+    '''Inverse of encodeBinaryRecord for a Buffer of complete Records.\n
+       Returns a List of (frame_index, timestamp, camera, shapes as SHAPE_RECORD_DTYPE Array).'''
+    records = []
+    offset = 0
+    while offset < len(data):
+        magic, version, camera, frame_index, timestamp, count = FRAME_HEADER.unpack_from(data, offset)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError(f'No detection record at offset {offset}.')
+        offset += FRAME_HEADER.size
+        shapes = np.frombuffer(data, dtype=SHAPE_RECORD_DTYPE, count=count, offset=offset)
+        offset += count * SHAPE_RECORD_DTYPE.itemsize
+        records.append((frame_index, timestamp, None if camera < 0 else camera, shapes))
+    return records
+
+ENCODERS = {'jsonl': encodeJsonLine, 'binary': encodeBinaryRecord}
+
+
+class DetectionPublisher:
+    '''Publishes the Shapes of every Frame to a File, UNIX Socket or TCP Port.\n
+       target: "file:<path>" (appended), "unix:<socket path>" or "tcp:<host>:<port>".
+       Sockets are connected (and reconnected) by the Background Thread, which encodes
+       and writes the queued Frames in Batches, so publish() never waits for I/O.
+       backpressure 'drop' drops the oldest queued Frame when the Queue is full,
+       'block' makes publish() wait for room and never loses a Frame.'''
+
+    def __init__(self, target, encoding='jsonl', backpressure='drop', max_pending=256,
+                 batch_size=64, flush_interval=0.05, reconnect_interval=1.0):
+        if encoding not in ENCODERS:
+            raise ValueError(f'Unknown detection encoding "{encoding}".')
+        if backpressure not in ('drop', 'block'):
+            raise ValueError(f'Unknown backpressure "{backpressure}".')
+
+        self.kind, _, self.address = target.partition(':')
+        if self.kind not in ('file', 'unix', 'tcp'):
+            raise ValueError(f'Unknown detection target "{target}".')
+        if self.kind == 'unix' and not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('UNIX sockets are not supported on this platform.')
+        self.target = target
+        self.encode = ENCODERS[encoding]
+        self.backpressure = backpressure
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.reconnect_interval = reconnect_interval
+
+        self.stream = open(self.address, 'ab') if self.kind == 'file' else None
+        self.connection = None
+        self.last_connect = None
+
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.published = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='detection-publisher', daemon=True)
+        self.thread.start()
+
+    def publish(self, shapes, timestamp=None, camera=None, frame_index=None):
+        '''Queues the Shapes (ShapeTable or List of ColoredShapes) of one Frame.\n
+           frame_index defaults to a running Number of the published Frames.'''
+        rows = shapes.rows.copy() if isinstance(shapes, ShapeTable) else ShapeTable.fromColoredShapes(shapes).rows
+        with self.condition:
+            if frame_index is None:
+                frame_index = self.sequence
+            self.sequence += 1
+            item = (frame_index, time.time() if timestamp is None else timestamp, camera, rows)
+
+            if len(self.pending) >= self.max_pending:
+                if self.backpressure == 'drop':
+                    self.pending.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self.pending) >= self.max_pending and self.running:
+                        self.condition.wait()
+            self.pending.append(item)
+            self.published += 1
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+
+    def _run(self):
+        batch = []
+        while True:
+            with self.condition:
+                if len(self.pending) < self.batch_size and self.running:
+                    self.condition.wait(self.flush_interval)
+                # a Batch kept for a Retry ('block') is completed first
+                while self.pending and len(batch) < self.batch_size:
+                    batch.append(self.pending.popleft())
+                # room for blocked Publishers
+                self.condition.notify_all()
+                stopping = not self.running
+
+            if batch:
+                if self.write(b''.join(self.encode(*item) for item in batch)):
+                    self.written += len(batch)
+                    self.batches += 1
+                    batch = []
+                elif self.backpressure == 'drop' or stopping:
+                    self.dropped += len(batch)
+                    batch = []
+                else:
+                    time.sleep(self.reconnect_interval)
+
+            if stopping and not self.pending and not batch:
+                break
+
+    def connect(self):
+        '''Connects the Socket, at most once per reconnect_interval. True when connected.'''
+        if self.connection is not None:
+            return True
+        now = time.monotonic()
+        if self.last_connect is not None and now - self.last_connect < self.reconnect_interval:
+            return False
+        self.last_connect = now
+
+        try:
+            if self.kind == 'unix':
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                connection.connect(self.address)
+            else:
+                host, _, port = self.address.rpartition(':')
+                connection = socket.create_connection((host or 'localhost', int(port)), timeout=self.reconnect_interval)
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection.settimeout(None)
+        except OSError:
+            self.errors += 1
+            return False
+        self.connection = connection
+        return True
+
+    def write(self, data):
+        '''Writes one encoded Batch, False when the Target is not reachable.'''
+        if self.kind == 'file':
+            self.stream.write(data)
+            self.stream.flush()
+            return True
+
+        if not self.connect():
+            return False
+        try:
+            self.connection.sendall(data)
+            return True
+        except OSError:
+            # the Consumer went away, the next Batch reconnects
+            self.errors += 1
+            self.connection.close()
+            self.connection = None
+            return False
+
+    def close(self):
+        '''Writes the queued Frames (as far as the Target is reachable) and stops the Thread.'''
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+        if self.stream is not None:
+            self.stream.close()
+        if self.connection is not None:
+            self.connection.close()
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'batches': self.batches,
+            'pending': len(self.pending)
+        }
@@ -4,12 +4,10 @@ from utils.consoleWriter import writeMessage
 
 def getVideoCapture(number, deviceWidth, deviceHeight, fastMode):
     '''Opens a new VideoCapture on the requested Video Device.\n 
-       When using Fast-Mode windows is required as the OS.\n 
-       Otherwise it will return None.'''
+       Fast-Mode uses the DirectShow Backend, which is only available on windows.\n 
+       On other OS the default Backend is used instead.'''
     
-    if fastMode:
-        if os.name != 'nt':
-            return None
+    if fastMode and os.name == 'nt':
         capture = cv2.VideoCapture(number, cv2.CAP_DSHOW)
     else:
         capture = cv2.VideoCapture(number)
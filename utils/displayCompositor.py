@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+from utils import ui
+
+SEPARATOR_COLOR = (255, 255, 255)
+
+class DisplayCompositor:
+    '''Owns the Output Canvases of the Windows, allocated once per Resolution.\n
+       Tiles, masked Images and scaled Views are written into the Canvases in place
+       (dst= of the OpenCV Functions into Slices), so showing a Frame allocates nothing
+       as long as the Resolution and Scale stay the same. A returned Canvas is only
+       valid until the next Call with the same Name.'''
+
+    def __init__(self, line_thickness=3):
+        self.line_thickness = line_thickness
+        self.canvases = {}
+        self.allocations = 0
+
+    def getCanvas(self, name, shape, fill=None):
+        '''Canvas of the given Shape, (re)allocated and filled only when the Shape changed.'''
+        canvas = self.canvases.get(name)
+        if canvas is None or canvas.shape != shape:
+            canvas = np.empty(shape, dtype=np.uint8)
+            if fill is not None:
+                canvas[:] = fill
+            self.canvases[name] = canvas
+            self.allocations += 1
+        return canvas
+
+    def scaled(self, image, name, scale):
+        '''image resized by scale into the Canvas of the Window, the Image itself for scale 1.'''
+        if scale <= 0 or scale == 1:
+            return image
+        h, w = image.shape[:2]
+        new_w, new_h = int(w * scale), int(h * scale)
+        canvas = self.getCanvas(f'{name} scaled', (new_h, new_w) + image.shape[2:])
+        cv2.resize(image, (new_w, new_h), dst=canvas)
+        return canvas
+
+    def copied(self, image, name):
+        '''Copy of the Image to draw on, the Image itself stays untouched.'''
+        canvas = self.getCanvas(name, image.shape)
+        np.copyto(canvas, image)
+        return canvas
+
+    def writeMasked(self, frame, mask, dst, mask_buffer):
+        '''Frame where the Mask is set, black elsewhere, written into dst.\n
+           A masked cv2.bitwise_and would leave the old Pixels of dst outside of the Mask,
+           so the Mask is expanded to 3 Channels in mask_buffer instead.'''
+        if mask is None:
+            dst[:] = 0
+            return dst
+        cv2.merge((mask, mask, mask), dst=mask_buffer)
+        return cv2.bitwise_and(frame, mask_buffer, dst=dst)
+
+    def masked(self, frame, mask, name):
+        canvas = self.getCanvas(name, frame.shape)
+        mask_buffer = self.getCanvas(f'{name} mask', frame.shape)
+        return self.writeMasked(frame, mask, canvas, mask_buffer)
+
+    def mosaic(self, frame, masks, name, scale=1):
+        '''2x2 Mosaic of the Frame masked by each of the (up to 4) Masks, row by row,
+           with Tiles of the scaled Frame Size and white Separators.\n
+           Replaces ui.combineImages, the Separators are only drawn when the Canvas is allocated.'''
+        if scale > 0 and scale != 1:
+            frame = self.scaled(frame, f'{name} frame', scale)
+        h, w = frame.shape[:2]
+        t = self.line_thickness
+        canvas = self.getCanvas(name, (2 * h + t, 2 * w + t, 3), SEPARATOR_COLOR)
+        mask_buffer = self.getCanvas(f'{name} mask', frame.shape)
+
+        for i in range(4):
+            row, column = divmod(i, 2)
+            tile = canvas[row * (h + t):row * (h + t) + h, column * (w + t):column * (w + t) + w]
+            mask = masks[i] if i < len(masks) else None
+            if mask is not None and mask.shape[:2] != (h, w):
+                tile_mask = self.getCanvas(f'{name} tile mask', (h, w))
+                mask = cv2.resize(mask, (w, h), dst=tile_mask, interpolation=cv2.INTER_NEAREST)
+            self.writeMasked(frame, mask, tile, mask_buffer)
+
+        return canvas
+
+    def show(self, image, title, scale, show):
+        '''ui.showImage with the scaled View written into the Canvas of the Window.'''
+        if show:
+            image = self.scaled(image, title, scale)
+        ui.showImage(image, title, 1, show)
+
+    def release(self):
+        self.canvases.clear()
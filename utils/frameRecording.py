@@ -0,0 +1,126 @@
+import os
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+RECORDING_FORMAT = 'lego-frames'
+RECORDING_VERSION = 1
+METADATA_FILE = 'recording.json'
+TIMESTAMPS_FILE = 'timestamps.bin'
+
+# Capture Time per Frame: monotonic (time.perf_counter(), for the Pacing) and wall Clock (time.time())
+TIMESTAMP_DTYPE = np.dtype([('time', '<f8'), ('wall_time', '<f8')])
+
+def getChunkPath(path, chunk):
+    return os.path.join(path, f'frames_{chunk:05}.bin')
+
+
+class FrameRecorder:
+    '''Writes cropped Frames and their Timestamps into a Recording Directory.\n
+       The Frames are stored raw in memory-mapped Chunk Files of chunk_frames Frames each,
+       writing a Frame is a single Copy into the mapped Pages (flushed by the OS).
+       Timestamps are appended and flushed per Frame, so a Recording stays readable
+       up to the last complete Frame, even when the Program was killed.'''
+
+    def __init__(self, path, chunk_frames=256):
+        if os.path.exists(os.path.join(path, METADATA_FILE)):
+            raise FileExistsError(f'Recording {path} already exists.')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.shape = None
+        self.chunk = None
+        self.frame_count = 0
+        self.timestamps = open(os.path.join(path, TIMESTAMPS_FILE), 'wb')
+        self.timestamp = np.zeros(1, dtype=TIMESTAMP_DTYPE)
+
+    def writeMetadata(self):
+        metadata = {
+            'format': RECORDING_FORMAT,
+            'version': RECORDING_VERSION,
+            'shape': list(self.shape),
+            'dtype': 'uint8',
+            'chunk_frames': self.chunk_frames,
+            'created': datetime.now().isoformat(timespec='seconds')
+        }
+        with open(os.path.join(self.path, METADATA_FILE), 'w', encoding='utf-8') as file:
+            json.dump(metadata, file, indent=2)
+
+    def write(self, frame_cropped, timestamp=None, wall_time=None):
+        '''Appends the Frame, timestamp / wall_time default to now.'''
+        if self.shape is None:
+            self.shape = frame_cropped.shape
+            self.writeMetadata()
+        elif frame_cropped.shape != self.shape:
+            raise ValueError(f'Frame shape {frame_cropped.shape} differs from the recording shape {self.shape}.')
+
+        slot = self.frame_count % self.chunk_frames
+        if slot == 0:
+            self.closeChunk()
+            self.chunk = np.memmap(getChunkPath(self.path, self.frame_count // self.chunk_frames), dtype=np.uint8,
+                                   mode='w+', shape=(self.chunk_frames,) + self.shape)
+        np.copyto(self.chunk[slot], frame_cropped)
+
+        self.timestamp['time'] = time.perf_counter() if timestamp is None else timestamp
+        self.timestamp['wall_time'] = time.time() if wall_time is None else wall_time
+        self.timestamps.write(self.timestamp.tobytes())
+        self.timestamps.flush()
+        self.frame_count += 1
+
+    def closeChunk(self):
+        '''Releases the Mapping of the current Chunk and truncates it to the written Frames.'''
+        if self.chunk is None:
+            return
+        self.chunk.flush()
+        chunk_path = self.chunk.filename
+        self.chunk = None
+        frames = self.frame_count - (self.frame_count - 1) // self.chunk_frames * self.chunk_frames
+        os.truncate(chunk_path, frames * int(np.prod(self.shape)))
+
+    def close(self):
+        self.closeChunk()
+        self.timestamps.close()
+
+
+class Recording:
+    '''Read-only, memory-mapped View on a Recording Directory (see FrameRecorder).\n
+       frame(index) returns a View into the mapped Chunk, no Frame is copied.'''
+
+    def __init__(self, path):
+        with open(os.path.join(path, METADATA_FILE), encoding='utf-8') as file:
+            metadata = json.load(file)
+        if metadata.get('format') != RECORDING_FORMAT or metadata.get('version') != RECORDING_VERSION:
+            raise ValueError(f'{path} is no recording of version {RECORDING_VERSION}.')
+
+        self.path = path
+        self.shape = tuple(metadata['shape'])
+        self.chunk_frames = metadata['chunk_frames']
+        frame_size = int(np.prod(self.shape))
+
+        self.timestamps = np.fromfile(os.path.join(path, TIMESTAMPS_FILE), dtype=TIMESTAMP_DTYPE)
+        self.chunks = []
+        frame_count = 0
+        while frame_count < len(self.timestamps):
+            chunk_path = getChunkPath(path, len(self.chunks))
+            if not os.path.exists(chunk_path):
+                break
+            # a Chunk of an interrupted Recording keeps its full Size, the Timestamps limit the Frames
+            frames = min(os.path.getsize(chunk_path) // frame_size, self.chunk_frames)
+            if frames == 0:
+                break
+            self.chunks.append(np.asarray(np.memmap(chunk_path, dtype=np.uint8, mode='r',
+                                                    shape=(frames,) + self.shape)))
+            frame_count += frames
+            if frames < self.chunk_frames:
+                break
+
+        self.frame_count = min(frame_count, len(self.timestamps))
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, index):
+        return self.chunks[index // self.chunk_frames][index % self.chunk_frames]
+
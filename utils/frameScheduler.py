@@ -0,0 +1,90 @@
+import time
+from collections import deque
+
+class FrameScheduler:
+    '''Starts Frames on fixed Deadlines of a monotonic Clock, so the Period includes the Processing.\n
+       Usage per Frame: wait() before grabbing the Frame, endFrame() after it was rendered.
+       With adaptive=True the Period is stretched to the smoothed Frame Time (plus headroom)
+       while the Processing overruns the requested Period, and shrinks back once it is faster.'''
+
+    def __init__(self, period, adaptive=True, headroom=1.1, max_period=None, smoothing=0.1, window=120):
+        self.requested_period = period
+        self.period = period
+        self.adaptive = adaptive
+        self.headroom = headroom
+        self.max_period = max_period
+        self.smoothing = smoothing
+
+        self.next_deadline = None
+        self.frame_start = None
+        self.frame_time = None
+        self.frame_starts = deque(maxlen=window)
+        self.overruns = 0
+        self.frames = 0
+
+    def setPeriod(self, period):
+        '''Requested Period in seconds, e.g. from the Refresh Rate Trackbar.'''
+        if period == self.requested_period:
+            return
+        self.requested_period = period
+        self.period = self.getAdaptedPeriod()
+        # the new Period applies to the next Deadline at the latest
+        if self.next_deadline is not None and self.frame_start is not None:
+            self.next_deadline = min(self.next_deadline, self.frame_start + self.period)
+
+    def wait(self):
+        '''Sleeps until the next Deadline and returns the Frame Start.\n
+           A Frame starting more than one Period late restarts the Deadlines, so missed Frames are not caught up.'''
+        now = time.perf_counter()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        elif now < self.next_deadline:
+            time.sleep(self.next_deadline - now)
+            now = time.perf_counter()
+        elif now - self.next_deadline > self.period:
+            self.next_deadline = now
+
+        self.frame_start = now
+        self.frame_starts.append(now)
+        self.next_deadline += self.period
+        return now
+
+    def endFrame(self):
+        '''Records the Frame Time (Grab to Render) and adapts the Period.'''
+        if self.frame_start is None:
+            return
+        frame_time = time.perf_counter() - self.frame_start
+        self.frames += 1
+        # without a requested Period (as fast as possible) no Frame can overrun
+        if self.requested_period > 0 and frame_time > self.requested_period:
+            self.overruns += 1
+
+        if self.frame_time is None:
+            self.frame_time = frame_time
+        else:
+            self.frame_time += self.smoothing * (frame_time - self.frame_time)
+        self.period = self.getAdaptedPeriod()
+
+    def getAdaptedPeriod(self):
+        if not self.adaptive or self.frame_time is None or self.requested_period <= 0:
+            return self.requested_period
+        period = max(self.requested_period, self.frame_time * self.headroom)
+        if self.max_period is not None:
+            period = min(period, max(self.max_period, self.requested_period))
+        return period
+
+    def achievedRate(self):
+        '''Frames per second over the Window of the last Frame Starts.'''
+        if len(self.frame_starts) < 2 or self.frame_starts[-1] == self.frame_starts[0]:
+            return 0.0
+        return (len(self.frame_starts) - 1) / (self.frame_starts[-1] - self.frame_starts[0])
+
+    def stats(self):
+        return {
+            'requested_fps': 1 / self.requested_period if self.requested_period > 0 else float('inf'),
+            'target_fps': 1 / self.period if self.period > 0 else float('inf'),
+            'achieved_fps': self.achievedRate(),
+            'frame_time_ms': None if self.frame_time is None else self.frame_time * 1000,
+            'overruns': self.overruns,
+            'frames': self.frames
+        }
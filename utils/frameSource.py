@@ -0,0 +1,260 @@
+import os
+import time
+import threading
+import cv2
+
+from utils import deviceManager
+from utils import frameRecording
+from utils.syntheticFrames import createSyntheticFrame
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class FrameSource:
+    '''Common Interface of everything delivering Frames: read() -> (frameAvailable, frame).'''
+
+    # False for Sources which can deliver Frames faster than real time
+    realtime = True
+
+    def read(self):
+        raise NotImplementedError
+
+    def readTimestamped(self):
+        '''read() with the Capture Time of the Frame (time.time()) -> (frameAvailable, frame, timestamp).'''
+        frameAvailable, frame = self.read()
+        return frameAvailable, frame, time.time()
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+
+    def __init__(self, number, deviceWidth, deviceHeight, fastMode):
+        self.capture = deviceManager.getVideoCapture(number, deviceWidth, deviceHeight, fastMode)
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(FrameSource):
+    realtime = False
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise FileNotFoundError(f'Video {path} could not be opened.')
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS)
+
+    def read(self):
+        frameAvailable, frame = self.capture.read()
+        if not frameAvailable and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            frameAvailable, frame = self.capture.read()
+        return frameAvailable, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageDirectorySource(FrameSource):
+    realtime = False
+
+    def __init__(self, path, loop=False):
+        self.loop = loop
+        self.paths = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if name.lower().endswith(IMAGE_EXTENSIONS)]
+        if len(self.paths) == 0:
+            raise FileNotFoundError(f'No images found in {path}.')
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop:
+                return False, None
+            self.index = 0
+
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return frame is not None, frame
+
+
+class SyntheticSource(FrameSource):
+    '''frame_count different synthetic Frames (see syntheticFrames), generated once and repeated when looping.'''
+    realtime = False
+
+    def __init__(self, size, brick_count, frame_count=8, loop=False, seed=0):
+        self.loop = loop
+        self.frames = [createSyntheticFrame(size, brick_count, seed + i)[0] for i in range(frame_count)]
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return False, None
+            self.index = 0
+
+        frame = self.frames[self.index]
+        self.index += 1
+        return True, frame
+
+
+class ReplaySource(FrameSource):
+    '''Feeds the Frames of a Recording as read-only Views into the mapped Chunks.\n
+       realtime=True keeps the recorded Frame Intervals, otherwise the Frames are delivered as fast as requested.'''
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.recording = frameRecording.Recording(path)
+        if len(self.recording) == 0:
+            raise FileNotFoundError(f'Recording {path} contains no frames.')
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self.start = None
+
+    def read(self):
+        if self.index >= len(self.recording):
+            if not self.loop:
+                return False, None
+            self.index = 0
+
+        if self.realtime:
+            if self.index == 0:
+                self.start = time.perf_counter()
+            timestamps = self.recording.timestamps['time']
+            time_to_sleep = self.start + (timestamps[self.index] - timestamps[0]) - time.perf_counter()
+            if time_to_sleep > 0:
+                time.sleep(time_to_sleep)
+
+        frame = self.recording.frame(self.index)
+        self.index += 1
+        return True, frame
+
+
+class LatestFrameReader(FrameSource):
+    '''Reads a real-time Source (e.g. a Camera) on a background Thread as fast as it delivers
+       and keeps only the newest Frame with its Capture Time, so the Driver Buffer never fills up
+       with old Frames while the Program sleeps or processes.\n
+       read() waits (as long as the Source delivers) for a Frame newer than the last returned one,
+       Frames that were overwritten before anybody read them are skipped.'''
+
+    def __init__(self, source, release_timeout=2.0):
+        self.source = source
+        self.realtime = source.realtime
+        # waiting for the Thread on release, a stalled Source is released anyway
+        self.release_timeout = release_timeout
+
+        self.condition = threading.Condition()
+        self.frame = None
+        self.timestamp = None
+        self.sequence = 0
+        self.delivered_sequence = 0
+        self.finished = False
+        self.error = None
+        self.captured = 0
+        self.delivered = 0
+        self.skipped = 0
+        # Age of the delivered Frames (Capture until read)
+        self.age_sum = 0.0
+        self.age_max = 0.0
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='frame-reader', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while self.running:
+                frameAvailable, frame = self.source.read()
+                timestamp = time.time()
+                if not frameAvailable:
+                    break
+                with self.condition:
+                    if self.sequence > self.delivered_sequence:
+                        self.skipped += 1
+                    self.frame = frame
+                    self.timestamp = timestamp
+                    self.sequence += 1
+                    self.captured += 1
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def read(self):
+        frameAvailable, frame, _ = self.readTimestamped()
+        return frameAvailable, frame
+
+    def readTimestamped(self):
+        with self.condition:
+            # a slow first Frame or a stalling Camera only delays the Read, like the Source itself
+            self.condition.wait_for(lambda: self.sequence > self.delivered_sequence or self.finished)
+            if self.sequence == self.delivered_sequence:
+                if self.error is not None:
+                    raise self.error
+                # the Source ended
+                return False, None, None
+
+            self.delivered_sequence = self.sequence
+            self.delivered += 1
+            age = time.time() - self.timestamp
+            self.age_sum += age
+            self.age_max = max(self.age_max, age)
+            return True, self.frame, self.timestamp
+
+    def release(self):
+        self.running = False
+        # the Thread returns with the next Frame of the Source
+        self.thread.join(timeout=self.release_timeout)
+        self.source.release()
+
+    def stats(self):
+        return {
+            'captured': self.captured,
+            'delivered': self.delivered,
+            'skipped': self.skipped,
+            'mean_age_ms': self.age_sum / self.delivered * 1000 if self.delivered > 0 else 0.0,
+            'max_age_ms': self.age_max * 1000
+        }
+
+
+def isCameraSpec(spec):
+    '''True for the Specs of Cameras (see openFrameSource), which never run out of Frames on their own.'''
+    kind, _, value = spec.partition(':')
+    return value == '' or kind == 'camera'
+
+def openFrameSource(spec, deviceWidth, deviceHeight, fastMode, loop=False, realtime=True, latest=False):
+    '''spec: "camera:<number>", "video:<path>", "images:<directory>", "synthetic:<brick count>"
+       (square Frames of the smaller Device Dimension) or "replay:<recording directory>"
+       (recorded Frame Intervals unless realtime is False).\n
+       A plain number is treated as a camera.
+       latest: Cameras are read by a LatestFrameReader, which only keeps the newest Frame.
+       Recordings are never wrapped, a Replay delivers every recorded Frame.'''
+    kind, _, value = spec.partition(':')
+    if value == '':
+        kind, value = 'camera', kind
+
+    match kind:
+        case 'camera':
+            source = CameraSource(int(value), deviceWidth, deviceHeight, fastMode)
+        case 'video':
+            source = VideoFileSource(value, loop)
+        case 'images':
+            source = ImageDirectorySource(value, loop)
+        case 'replay':
+            source = ReplaySource(value, realtime, loop)
+        case 'synthetic':
+            source = SyntheticSource(int(min(deviceWidth, deviceHeight)), int(value), loop=loop)
+        case _:
+            raise ValueError(f'Unknown frame source "{spec}".')
+
+    if latest and isinstance(source, CameraSource):
+        return LatestFrameReader(source)
+    return source
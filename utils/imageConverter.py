@@ -42,18 +42,9 @@ def resizeImage(image, factor) -> np.ndarray:
     return resized
 
 def tryCutRoiWithOffset(roi, offset, image):
+    '''Cuts the ROI out of the Image, extended by offset Pixels on every Side as far as the Image reaches.'''
     x, y, w, h = roi
     img_h, img_w = image.shape[:2]
 
-    if x >= offset & x <= img_w - offset:
-        x_minus_offset = x - offset
-        x_plus_offset = x + offset
-
-    if y >= offset & y <= img_h-offset:
-        y_minus_offset = y - offset
-        y_plus_offset = y + offset
-
-    if (not x_minus_offset is None) & (not y_minus_offset is None):
-        return image[y_minus_offset:y_plus_offset+h, x_minus_offset:x_plus_offset+w]
-    
-    return image[y:y+h, x:x+w]
\ No newline at end of file
+    # the Offset is clipped at the Image Borders (negative Indices would wrap around)
+    return image[max(y - offset, 0):min(y + h + offset, img_h), max(x - offset, 0):min(x + w + offset, img_w)]
\ No newline at end of file
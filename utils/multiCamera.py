@@ -0,0 +1,345 @@
+import os
+import time
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from utils import frameSource
+from utils import imageConverter
+from utils import consoleWriter
+from utils.frameScheduler import FrameScheduler
+from utils.frameRecording import FrameRecorder
+from models.detector import Detector
+from models.shapeTable import ShapeTable
+from models.shapeTracker import ShapeTracker
+from models.templateBank import TemplateBank
+from models.templateClassifier import TemplateClassifier
+import models.colorLookup as colorLookup
+import models.algorithms as alg
+
+
+class FrameRing:
+    '''Ring of equally sized Frame Slots in one SharedMemory Block.\n
+       Created by the Parent Process (which unlinks it), attached by the Camera Worker.'''
+
+    def __init__(self, slots, shape, name=None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        size = slots * int(np.prod(self.shape))
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf)
+
+    def write(self, slot, frame):
+        np.copyto(self.frames[slot], frame)
+
+    def close(self):
+        self.frames = None
+        try:
+            self.memory.close()
+        except BufferError:
+            # Frame Views are still referenced, the Mapping is released together with the last one
+            pass
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+class CameraDetection:
+    '''One Frame of the merged Detection Stream.\n
+       shapes: ShapeTable with the camera Column set.
+       frame: cropped Frame as View into the FrameRing of the Camera or None, when no Slot was free.
+       The View stays valid until the next Detection of the same Camera was returned.'''
+
+    def __init__(self, camera, index, timestamp, processing_time, shapes, slot, frame=None):
+        self.camera = camera
+        self.index = index
+        # Wall Clock Time of the Capture (time.time())
+        self.timestamp = timestamp
+        self.processing_time = processing_time
+        self.shapes = shapes
+        self.slot = slot
+        self.frame = frame
+
+
+def runCameraWorker(camera, spec, settings, results, slot_queue, stop_event):
+    '''Capture and Detection Loop of one Camera, runs in its own Process.\n
+       Messages to the Parent: ('opened', camera, shape), ('detection', camera, index, timestamp,
+       processing_time, rows, slot) and finally ('finished', camera, error).
+       The Parent answers 'opened' with the Name of the FrameRing and its Slots on the slot_queue,
+       afterwards it gives back every Slot it no longer reads.'''
+    # Messages stay in the Log of the Worker, Errors are reported with 'finished'
+    consoleWriter.loop_active = True
+    cv2.setNumThreads(settings['opencv_threads'])
+
+    error = 'Worker exited.'
+    source = None
+    recorder = None
+    ring = None
+    try:
+        source = frameSource.openFrameSource(spec, settings['device_width'], settings['device_height'],
+                                             settings['fast_mode'], settings['loop'], settings['period'] > 0,
+                                             settings['latest_frame'])
+        if settings['record_path'] != '':
+            recorder = FrameRecorder(os.path.join(settings['record_path'], f'camera_{camera}'))
+        color_lut = None
+        if settings['segmentation_mode'] == 'lut':
+            color_lut = colorLookup.loadColorLUT(settings['lut_cache_dir'], alg.BACKGROUND_RANGE,
+                                                 alg.COLOR_RANGES, settings['lut_bits'])
+        classifier = None
+        if settings['classifier'] == 'template':
+            classifier = TemplateClassifier(TemplateBank(settings['template_dir'], scale=settings['processing_scale']),
+                                            settings['classification_budget'], scale=settings['processing_scale'])
+        detector = Detector(color_lut, classifier=classifier, scale=settings['processing_scale'],
+                            refine=settings['processing_refine'])
+        tracker = ShapeTracker() if settings['tracking'] else None
+        # Sources faster than real time are paced to the Refresh Rate
+        scheduler = None
+        if not source.realtime and settings['period'] > 0:
+            scheduler = FrameScheduler(settings['period'], adaptive=False)
+
+        index = 0
+        while not stop_event.is_set():
+            if scheduler is not None:
+                scheduler.wait()
+            frameAvailable, frame, timestamp = source.readTimestamped()
+            if not frameAvailable:
+                break
+
+            frame_cropped = imageConverter.getImageCenterSquare(frame)
+            if recorder is not None:
+                recorder.write(frame_cropped, wall_time=timestamp)
+
+            start = time.perf_counter()
+            # the Parent gets the Frame at the Processing Scale, matching the ROIs
+            frame_processed = detector.scaleFrame(frame_cropped)
+            result = detector.detect(frame_processed, tracker=tracker, frame_full=frame_cropped)
+            rows = result.coloredShapes.rows
+            rows['camera'] = camera
+            processing_time = time.perf_counter() - start
+
+            if ring is None:
+                results.put(('opened', camera, frame_processed.shape))
+                handshake = _getMessage(slot_queue, stop_event)
+                if handshake is None:
+                    break
+                ring_name, free_slots = handshake
+                ring = FrameRing(settings['slots'], frame_processed.shape, ring_name)
+
+            # the Detection is sent in any Case, the Frame only when a Slot is free
+            slot = -1
+            if frame_processed.shape == ring.shape:
+                if len(free_slots) == 0:
+                    try:
+                        free_slots.append(slot_queue.get_nowait())
+                    except queue.Empty:
+                        pass
+                if len(free_slots) > 0:
+                    slot = free_slots.pop()
+                    ring.write(slot, frame_processed)
+
+            if not _putMessage(results, ('detection', camera, index, timestamp, processing_time, rows, slot), stop_event):
+                break
+            index += 1
+
+        error = None
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        if source is not None:
+            source.release()
+        if recorder is not None:
+            recorder.close()
+        if ring is not None:
+            ring.close()
+        results.put(('finished', camera, error))
+
+def _getMessage(message_queue, stop_event):
+    while not stop_event.is_set():
+        try:
+            return message_queue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+def _putMessage(message_queue, message, stop_event):
+    '''Blocks while the Parent falls behind (Backpressure onto the Capture). False when stopped.'''
+    while not stop_event.is_set():
+        try:
+            message_queue.put(message, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class MultiCameraRunner:
+    '''Drives one Capture and Detection Process per Camera and merges their Detections.\n
+       specs: Frame Source per Camera (see frameSource.openFrameSource), e.g. ['camera:0', 'video:belt.mp4'].
+       record_path: Directory of one Recording per Camera (camera_<n>) or '' for no Recording.
+       classifier: 'ratio' or 'template' (TemplateClassifier with classification_budget Seconds per Frame).
+       processing_scale / processing_refine: see Detector, the Frames of the Detections are at the Processing Scale.
+       latest_frame: Cameras are read by a LatestFrameReader (see frameSource.openFrameSource).
+       Frames are passed through a FrameRing per Camera instead of being pickled,
+       only the (small) ShapeTable Rows go through the Result Queue.'''
+
+    def __init__(self, specs, device_width=640, device_height=480, fast_mode=False, loop=False,
+                 segmentation_mode='hsv', lut_cache_dir='cache', lut_bits=7, tracking=True,
+                 period=0.0, record_path='', classifier='ratio', template_dir=os.path.join('assets', 'd02_templates_s'),
+                 classification_budget=0.02, processing_scale=1.0, processing_refine=False, latest_frame=True,
+                 slots=3, queue_size=None):
+        self.specs = list(specs)
+        # Workers share the Cores, each OpenCV gets its Share of Threads
+        opencv_threads = max(1, (os.cpu_count() or 1) // max(1, len(self.specs)))
+        self.settings = {
+            'device_width': device_width,
+            'device_height': device_height,
+            'fast_mode': fast_mode,
+            'loop': loop,
+            'segmentation_mode': segmentation_mode,
+            'lut_cache_dir': lut_cache_dir,
+            'lut_bits': lut_bits,
+            'tracking': tracking,
+            'period': period,
+            'record_path': record_path,
+            'classifier': classifier,
+            'template_dir': template_dir,
+            'classification_budget': classification_budget,
+            'processing_scale': processing_scale,
+            'processing_refine': processing_refine,
+            'latest_frame': latest_frame,
+            'slots': slots,
+            'opencv_threads': opencv_threads
+        }
+
+        # spawn on every OS, forking a Process with running Threads is unsafe
+        self.context = multiprocessing.get_context('spawn')
+        self.results = self.context.Queue(queue_size or 4 * max(1, len(self.specs)))
+        self.slot_queues = [self.context.Queue() for _ in self.specs]
+        self.stop_event = self.context.Event()
+        self.processes = [self.context.Process(target=runCameraWorker, name=f'camera-{camera}', daemon=True,
+                                               args=(camera, spec, self.settings, self.results,
+                                                     self.slot_queues[camera], self.stop_event))
+                          for camera, spec in enumerate(self.specs)]
+
+        self.rings = [None] * len(self.specs)
+        # Slot of the last returned Detection per Camera, given back with the next one
+        self.held_slots = [-1] * len(self.specs)
+        self.finished_cameras = set()
+        self.errors = {}
+        self.detections = [0] * len(self.specs)
+        self.frames_without_slot = [0] * len(self.specs)
+        self.first_timestamps = [None] * len(self.specs)
+        self.last_timestamps = [None] * len(self.specs)
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def getDetection(self, timeout=None):
+        '''Returns the next CameraDetection of any Camera or None, when the timeout expired.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # Workers that exited before this Read had flushed all of their Messages
+            exited = [camera for camera, process in enumerate(self.processes)
+                      if camera not in self.finished_cameras and process.exitcode is not None]
+            remaining = 0.1 if deadline is None else min(0.1, max(0.0, deadline - time.monotonic()))
+            try:
+                message = self.results.get(timeout=remaining)
+            except queue.Empty:
+                self._handleExitedWorkers(exited)
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                continue
+
+            detection = self._handleMessage(message)
+            if detection is not None:
+                return detection
+
+    def _handleExitedWorkers(self, cameras):
+        '''Finishes the Cameras whose Worker died without a 'finished' Message
+           (crash, killed by the OS or failed to start).'''
+        for camera in cameras:
+            if camera in self.finished_cameras:
+                continue
+            self.finished_cameras.add(camera)
+            self.errors[camera] = f'Worker exited with code {self.processes[camera].exitcode}.'
+            consoleWriter.writeError(f'Camera {camera} ({self.specs[camera]}) stopped', self.errors[camera])
+
+    def _handleMessage(self, message):
+        kind, camera = message[0], message[1]
+
+        if kind == 'opened':
+            ring = FrameRing(self.settings['slots'], message[2])
+            self.rings[camera] = ring
+            self.slot_queues[camera].put((ring.name, list(range(ring.slots))))
+            return None
+
+        if kind == 'finished':
+            self.finished_cameras.add(camera)
+            if message[2] is not None:
+                self.errors[camera] = message[2]
+                consoleWriter.writeError(f'Camera {camera} ({self.specs[camera]}) stopped', message[2])
+            return None
+
+        _, camera, index, timestamp, processing_time, rows, slot = message
+        if self.held_slots[camera] >= 0:
+            self.slot_queues[camera].put(self.held_slots[camera])
+        self.held_slots[camera] = slot
+
+        self.detections[camera] += 1
+        if slot < 0:
+            self.frames_without_slot[camera] += 1
+        if self.first_timestamps[camera] is None:
+            self.first_timestamps[camera] = timestamp
+        self.last_timestamps[camera] = timestamp
+
+        frame = self.rings[camera].frames[slot] if slot >= 0 else None
+        return CameraDetection(camera, index, timestamp, processing_time, ShapeTable(rows), slot, frame)
+
+    def finished(self):
+        '''True when every Camera finished and all of their Detections were returned.'''
+        return len(self.finished_cameras) == len(self.specs) and self.results.empty()
+
+    def stop(self):
+        self.stop_event.set()
+        # Workers only exit once their queued Messages were taken
+        deadline = time.monotonic() + 5
+        while any(process.is_alive() for process in self.processes) and time.monotonic() < deadline:
+            try:
+                self._handleMessage(self.results.get(timeout=0.05))
+            except queue.Empty:
+                pass
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+        for ring in self.rings:
+            if ring is not None:
+                ring.close()
+                ring.unlink()
+        self.rings = [None] * len(self.specs)
+
+    def stats(self):
+        '''Detections and achieved Frame Rate per Camera.'''
+        stats = []
+        for camera, spec in enumerate(self.specs):
+            first, last = self.first_timestamps[camera], self.last_timestamps[camera]
+            detections = self.detections[camera]
+            fps = (detections - 1) / (last - first) if detections > 1 and last > first else 0.0
+            stats.append({
+                'camera': camera,
+                'source': spec,
+                'detections': detections,
+                'fps': fps,
+                'frames_without_slot': self.frames_without_slot[camera],
+                'error': self.errors.get(camera)
+            })
+        return stats
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+class DropOldestQueue:
+    '''Bounded Queue, which drops the oldest Item instead of blocking the Producer.'''
+
+    def __init__(self, maxsize):
+        self.items = deque()
+        self.maxsize = max(1, maxsize)
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        '''Returns the next Item or None, when the Queue was closed or the timeout expired.'''
+        with self.condition:
+            if not self.items and not self.closed:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def depth(self):
+        with self.condition:
+            return len(self.items)
+
+
+class FramePipeline:
+    '''Capture Thread -> Processing Worker(s) -> Consumer (usually the main Thread).\n
+       read_frame: () -> (frameAvailable, frame)\n
+       process_frame: frame -> result'''
+
+    def __init__(self, read_frame, process_frame, workers=1, queue_size=2):
+        self.read_frame = read_frame
+        self.process_frame = process_frame
+        self.frame_queue = DropOldestQueue(queue_size)
+        self.result_queue = DropOldestQueue(queue_size)
+
+        # Minimum time between two captured Frames in seconds
+        self.interval = 0.0
+
+        self.running = False
+        self.capture_finished = False
+        self.error = None
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.results_stale = 0
+        self.last_index = -1
+
+        self.threads = [threading.Thread(target=self._capture, name='capture', daemon=True)]
+        self.threads += [threading.Thread(target=self._work, name=f'worker-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        self.workers_active = len(self.threads) - 1
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.frame_queue.close()
+        self.result_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=1)
+
+    def _capture(self):
+        index = 0
+        last_capture = None
+        try:
+            while self.running:
+                if last_capture is not None:
+                    time_to_sleep = self.interval - (time.monotonic() - last_capture)
+                    if time_to_sleep > 0:
+                        time.sleep(time_to_sleep)
+                last_capture = time.monotonic()
+
+                frameAvailable, frame = self.read_frame()
+                if not frameAvailable:
+                    break
+
+                self.frames_captured += 1
+                self.frame_queue.put((index, frame))
+                index += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self.capture_finished = True
+            self.frame_queue.close()
+
+    def _work(self):
+        try:
+            while self.running:
+                item = self.frame_queue.get()
+                if item is None:
+                    break
+                index, frame = item
+                result = self.process_frame(frame)
+                with self.lock:
+                    self.frames_processed += 1
+                self.result_queue.put((index, result))
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.lock:
+                self.workers_active -= 1
+                if self.workers_active == 0:
+                    self.result_queue.close()
+
+    def getResult(self, timeout=None):
+        '''Returns the next Result in Frame order or None.\n
+           Results older than the last returned one (possible with several Workers) are discarded.'''
+        while True:
+            item = self.result_queue.get(timeout)
+            if item is None:
+                return None
+            index, result = item
+            if index < self.last_index:
+                self.results_stale += 1
+                continue
+            self.last_index = index
+            return result
+
+    def finished(self):
+        return self.result_queue.closed and self.result_queue.depth() == 0
+
+    def stats(self):
+        return {
+            'captured': self.frames_captured,
+            'processed': self.frames_processed,
+            'dropped_frames': self.frame_queue.dropped,
+            'dropped_results': self.result_queue.dropped,
+            'stale_results': self.results_stale,
+            'frame_queue_depth': self.frame_queue.depth(),
+            'frame_queue_max_depth': self.frame_queue.max_depth,
+            'result_queue_depth': self.result_queue.depth(),
+            'result_queue_max_depth': self.result_queue.max_depth
+        }
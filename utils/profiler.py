@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+class StageProfiler:
+    '''Measures the time spent per Stage and Frame with rolling Percentiles.\n
+       Usage per Frame and Thread: startFrame(), lap(stage) after every Stage, endFrame(total).\n
+       Every call returns immediately while the Profiler is disabled.'''
+
+    def __init__(self, enabled=False, window=300):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+        self.frame_ends = {}
+        self.lock = threading.Lock()
+        # every Thread measures its own Frames
+        self.local = threading.local()
+
+    def startFrame(self):
+        if not self.enabled:
+            return
+        local = self.local
+        local.current = {}
+        local.start = local.last = time.perf_counter()
+
+    def lap(self, stage):
+        '''Adds the time since the last lap (or startFrame) to the Stage.'''
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        local = self.local
+        current = local.current
+        current[stage] = current.get(stage, 0.0) + now - local.last
+        local.last = now
+
+    def endFrame(self, total='frame'):
+        '''Records the Stages of the Frame and its total time under the given name.'''
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        local = self.local
+        local.current[total] = now - local.start
+
+        with self.lock:
+            for stage, duration in local.current.items():
+                if stage not in self.samples:
+                    self.samples[stage] = deque(maxlen=self.window)
+                self.samples[stage].append(duration)
+            if total not in self.frame_ends:
+                self.frame_ends[total] = deque(maxlen=self.window)
+            self.frame_ends[total].append(now)
+
+    def record(self, name, duration):
+        '''Adds a Duration measured outside of the Frame Stages, e.g. a Latency across Threads.'''
+        if not self.enabled:
+            return
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(duration)
+
+    def fps(self, total='frame'):
+        '''Effective Frames per second over the Window.'''
+        with self.lock:
+            frame_ends = list(self.frame_ends.get(total, []))
+        if len(frame_ends) < 2 or frame_ends[-1] == frame_ends[0]:
+            return 0.0
+        return (len(frame_ends) - 1) / (frame_ends[-1] - frame_ends[0])
+
+    def report(self):
+        '''Returns {stage: {'p50_ms', 'p95_ms', 'p99_ms', 'count'}} and the fps per total.'''
+        with self.lock:
+            samples = {stage: np.array(values) * 1000 for stage, values in self.samples.items()}
+            totals = list(self.frame_ends)
+
+        stages = {}
+        for stage, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stages[stage] = {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'count': len(values)}
+
+        return {'stages': stages, 'fps': {total: self.fps(total) for total in totals}}
+
+    def summaryLines(self):
+        report = self.report()
+        lines = [f'{total}: {fps:.1f} FPS' for total, fps in report['fps'].items()]
+        for stage, stats in report['stages'].items():
+            lines.append(f'{stage:<16} p50 {stats["p50_ms"]:6.2f}  p95 {stats["p95_ms"]:6.2f}  p99 {stats["p99_ms"]:6.2f} ms')
+        return lines
+
+
+# Shared disabled Profiler for callers without Profiling
+DISABLED = StageProfiler(enabled=False)
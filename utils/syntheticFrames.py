@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+
+from models.dataclasses import LegoColor, ShapeType
+
+# Median BGR Values of the Bricks and the Paper in assets/d02_templates_l
+BRICK_COLORS = {
+    LegoColor.BLUE: (115, 42, 1),
+    LegoColor.GREEN: (44, 66, 10),
+    LegoColor.RED: (10, 6, 138),
+    LegoColor.YELLOW: (40, 140, 182)
+}
+BACKGROUND_COLOR = (175, 170, 170)
+
+# Brick Sizes in Studs (short side, long side) and the Colors they exist in
+BRICK_TYPES = [
+    (ShapeType.ONE_X_THREE, (1, 3), [LegoColor.BLUE, LegoColor.YELLOW]),
+    (ShapeType.ONE_X_FOUR, (1, 4), [LegoColor.BLUE, LegoColor.YELLOW]),
+    (ShapeType.TWO_X_TWO, (2, 2), [LegoColor.GREEN, LegoColor.RED]),
+    (ShapeType.TWO_X_FOUR, (2, 4), [LegoColor.GREEN, LegoColor.RED])
+]
+
+# Width of one Stud relative to the Frame size (about 46 px in a 1080 px frame)
+STUD_SCALE = 0.043
+
+def createSyntheticFrame(size, brick_count, seed=0):
+    '''Draws brick_count rotated Bricks on a square Frame of size x size Pixels.\n
+       Returns the Frame and a List of (LegoColor, ShapeType, center, angle) per Brick.'''
+    rng = np.random.default_rng(seed)
+    frame = np.full((size, size, 3), BACKGROUND_COLOR, dtype=np.uint8)
+    stud = size * STUD_SCALE
+
+    # one Brick per Grid Cell, so the Bricks never touch
+    cells_per_row = int(np.ceil(np.sqrt(brick_count)))
+    cell_size = size / cells_per_row
+    cells = rng.permutation(cells_per_row * cells_per_row)[:brick_count]
+
+    # shrinking the Bricks when the Cells get too small
+    scale = min(1.0, cell_size / (stud * 4 * 1.2))
+
+    bricks = []
+    for cell in cells:
+        shapeType, (short_side, long_side), colors = BRICK_TYPES[rng.integers(len(BRICK_TYPES))]
+        color = colors[rng.integers(len(colors))]
+        angle = float(rng.uniform(0, 180))
+
+        row, column = divmod(int(cell), cells_per_row)
+        center = ((column + 0.5) * cell_size, (row + 0.5) * cell_size)
+        box_size = (short_side * stud * scale, long_side * stud * scale)
+
+        corners = cv2.boxPoints((center, box_size, angle)).astype(np.int32)
+        cv2.fillConvexPoly(frame, corners, BRICK_COLORS[color])
+        bricks.append((color, shapeType, center, angle))
+
+    # a little Sensor Noise
+    noise = rng.normal(0, 2, frame.shape)
+    frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+    return frame, bricks
@@ -81,8 +81,11 @@ def drawInfo(image, shapes, color, line_thickness):
         
         x,y,w,h = shape.roi
         
+        # the stable Track ID when tracked, the List Index otherwise
+        label = getattr(shape, 'trackId', None) or i+1
+        
         cv2.putText(
-            image, f'[{i+1}]',
+            image, f'[{label}]',
             (x-5, y-20), 
             cv2.FONT_ITALIC, 
             0.8, 
@@ -91,11 +94,17 @@ def drawInfo(image, shapes, color, line_thickness):
         
     return image
 
+# Titles of the Windows opened by showImage
+open_windows = set()
+
 def showImage(image, title, scale, show):
     if show:
+        open_windows.add(title)
         if scale == 1:
             cv2.imshow(title, image)
             return
         cv2.imshow(title, resizeImage(image, scale))
-    elif cv2.getWindowProperty(title, cv2.WND_PROP_VISIBLE) > 0:
-        cv2.destroyWindow(title)  
\ No newline at end of file
+    elif title in open_windows:
+        open_windows.discard(title)
+        if cv2.getWindowProperty(title, cv2.WND_PROP_VISIBLE) > 0:
+            cv2.destroyWindow(title)  
\ No newline at end of file